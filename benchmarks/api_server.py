@@ -0,0 +1,315 @@
+"""Local stand-in for the Telegram Bot API with flood-control simulation
+
+Serves the subset of the Bot API this bot uses (getUpdates, sendMessage,
+sendPhoto, sendMediaGroup, sendVideoNote, setWebhook, plus the harmless
+calls around them) so the whole app can be soak-tested offline:
+
+    python -m benchmarks.api_server --port 8081 --latency-ms 30
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+
+Every response is delayed by the configured latency. Sends are charged
+against a per-chat and a global token bucket shaped like Telegram's limits,
+and a request that overdraws either is refused with a real 429 carrying
+`retry_after`. Updates for getUpdates are injected with `POST /updates`
+(one update or a list, `update_id` optional); `GET /stats` reports calls
+per method and how many were refused.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from aiohttp import web
+
+# Sends charged against the flood limits; other methods only get latency
+PACED_PREFIXES = ("send", "copy", "forward")
+
+
+class Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens (capped at the burst) are available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        missing = min(cost, self.burst) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class FloodControl:
+    """Telegram-like limits: per private chat, per group and for the whole bot"""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_per_minute: float = 20.0,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_minute / 60
+        self._global = Bucket(global_rate, global_rate, time.monotonic())
+        self._chats: dict[str, Bucket] = {}
+
+    def check(self, chat_id: str, cost: int) -> int:
+        """0 if the send may go through, otherwise `retry_after` in seconds"""
+        now = time.monotonic()
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id.startswith(("-", "@")):
+                bucket = Bucket(self.group_rate, 1, now)
+            else:
+                bucket = Bucket(self.chat_rate, self.chat_burst, now)
+            self._chats[chat_id] = bucket
+        wait = max(bucket.wait(cost, now), self._global.wait(cost, now))
+        if wait:
+            # Telegram reports whole seconds and a refused request costs nothing
+            return math.ceil(wait)
+        bucket.tokens -= cost
+        self._global.tokens -= cost
+        return 0
+
+
+class FakeBotAPI:
+    """aiohttp application answering `/bot<token>/<method>` like Telegram"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        flood: Optional[FloodControl] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood = flood
+        self.calls: Counter[str] = Counter()
+        self.refused: Counter[str] = Counter()
+        self.webhook_url = ""
+        self._updates: list[dict[str, Any]] = []
+        self._next_update_id = 1
+        self._new_updates = asyncio.Event()
+        self._message_id = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        app.router.add_post("/updates", self.handle_inject)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    def feed(self, update: dict[str, Any]) -> int:
+        """Queue an update for getUpdates and return its update_id"""
+        update = dict(update)
+        update.setdefault("update_id", self._next_update_id)
+        self._next_update_id = max(self._next_update_id, update["update_id"] + 1)
+        self._updates.append(update)
+        self._new_updates.set()
+        return update["update_id"]
+
+    async def handle_inject(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        ids = [
+            self.feed(update) for update in (body if isinstance(body, list) else [body])
+        ]
+        return web.json_response({"ok": True, "result": ids})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "calls": dict(self.calls),
+                "refused": dict(self.refused),
+                "pending_updates": len(self._updates),
+            }
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token, method = request.match_info["token"], request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(self.latency + random.uniform(-spread, spread))
+
+        if self.flood is not None and method.startswith(PACED_PREFIXES):
+            cost = len(params.get("media") or ()) if method == "sendMediaGroup" else 1
+            retry_after = self.flood.check(str(params.get("chat_id", "")), cost or 1)
+            if retry_after:
+                self.refused[method] += 1
+                return self._error(
+                    429,
+                    f"Too Many Requests: retry after {retry_after}",
+                    parameters={"retry_after": retry_after},
+                )
+
+        handler = getattr(self, f"_{method}", None)
+        if handler is not None:
+            result = await handler(token, params)
+        elif method.startswith(PACED_PREFIXES):
+            result = self._message(params)
+        else:
+            # answerCallbackQuery, editMessage*, deleteWebhook, close...
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    async def _params(request: web.Request) -> dict[str, Any]:
+        if request.content_type == "application/json":
+            raw = await request.json()
+        else:
+            # aiogram sends multipart forms with nested values as JSON strings
+            raw = {**request.query, **await request.post()}
+        params = {}
+        for key, value in raw.items():
+            if isinstance(value, web.FileField):
+                value = f"upload-{value.filename}"
+            elif isinstance(value, str) and value[:1] in "[{":
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    @staticmethod
+    def _error(code: int, description: str, **extra: Any) -> web.Response:
+        return web.json_response(
+            {"ok": False, "error_code": code, "description": description, **extra},
+            status=code,
+        )
+
+    def _message(self, params: dict[str, Any], **content: Any) -> dict[str, Any]:
+        self._message_id += 1
+        try:
+            chat_id = int(params.get("chat_id", 0))
+        except ValueError:  # @channelusername
+            chat_id = -1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            **content,
+        }
+
+    @staticmethod
+    def _file(value: Any, **size: Any) -> dict[str, Any]:
+        file_id = value if isinstance(value, str) else "fake-file"
+        return {"file_id": file_id, "file_unique_id": file_id[-16:], **size}
+
+    async def _getMe(self, token: str, params: dict[str, Any]) -> dict[str, Any]:
+        bot_id = int(token.split(":")[0]) if token[:1].isdigit() else 1
+        return {
+            "id": bot_id,
+            "is_bot": True,
+            "first_name": "Stand-in",
+            "username": "bot",
+        }
+
+    async def _getUpdates(
+        self, token: str, params: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        # A new offset confirms everything before it, like Telegram does
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_updates.wait(), float(params.get("timeout") or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def _setWebhook(self, token: str, params: dict[str, Any]) -> bool:
+        self.webhook_url = params.get("url", "")
+        return True
+
+    async def _sendMessage(self, token: str, params: dict[str, Any]) -> dict[str, Any]:
+        return self._message(params, text=params.get("text", ""))
+
+    async def _sendPhoto(self, token: str, params: dict[str, Any]) -> dict[str, Any]:
+        photo = self._file(params.get("photo"), width=1280, height=720)
+        return self._message(params, photo=[photo], caption=params.get("caption"))
+
+    async def _sendVideoNote(
+        self, token: str, params: dict[str, Any]
+    ) -> dict[str, Any]:
+        note = self._file(params.get("video_note"), length=384, duration=10)
+        return self._message(params, video_note=note)
+
+    async def _sendMediaGroup(
+        self, token: str, params: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        group_id = str(self._message_id + 1)
+        messages = []
+        for item in params.get("media") or ():
+            if item.get("type") == "photo":
+                content = {"photo": [self._file(item.get("media"), width=1, height=1)]}
+            else:
+                content = {
+                    item.get("type", "document"): self._file(
+                        item.get("media"), width=1, height=1, duration=1
+                    )
+                }
+            messages.append(self._message(params, media_group_id=group_id, **content))
+        return messages
+
+
+async def serve(api: FakeBotAPI, host: str, port: int) -> web.AppRunner:
+    """Start the stand-in server; the caller owns the returned runner"""
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def run(args: argparse.Namespace) -> None:
+    flood = None
+    if not args.no_flood_control:
+        flood = FloodControl(
+            args.global_rate, args.chat_rate, args.chat_burst, args.group_per_minute
+        )
+    api = FakeBotAPI(args.latency_ms / 1000, args.jitter, flood)
+    runner = await serve(api, args.host, args.port)
+    print(f"Bot API stand-in on http://{args.host}:{args.port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter", type=float, default=0.2, help="fraction of latency")
+    parser.add_argument("--global-rate", type=float, default=30, help="sends/s per bot")
+    parser.add_argument("--chat-rate", type=float, default=1, help="sends/s per chat")
+    parser.add_argument("--chat-burst", type=float, default=3)
+    parser.add_argument("--group-per-minute", type=float, default=20)
+    parser.add_argument("--no-flood-control", action="store_true")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
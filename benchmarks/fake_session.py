@@ -0,0 +1,87 @@
+import asyncio
+import random
+import typing
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message, User
+
+
+class FakeSession(BaseSession):
+    """In-process Bot API session: records calls and simulates latency
+
+    Requests are serialized the way a real session would, so their CPU cost
+    is included, then answered after `latency` seconds (+-`jitter`, as a
+    fraction) with a minimal valid result. `requests` keeps every method
+    unless `keep` is False, which large runs use to save memory.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, keep: bool = True):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.keep = keep
+        self.requests: list[TelegramMethod] = []
+        self.counts: Counter[str] = Counter()
+        self._message_id = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: Optional[int] = None,
+    ) -> TelegramType:
+        files: dict[str, Any] = {}
+        for value in method.model_dump(warnings=False).values():
+            self.prepare_value(value, bot=bot, files=files)
+
+        self.counts[method.__api_method__] += 1
+        if self.keep:
+            self.requests.append(method)
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(self.latency + random.uniform(-spread, spread))
+        return self._result(bot, method)
+
+    def sent(self, method_type: type) -> list[TelegramMethod]:
+        return [r for r in self.requests if isinstance(r, method_type)]
+
+    def _message(self, bot: Bot, chat_id: Any) -> Message:
+        self._message_id += 1
+        return Message.model_validate(
+            {
+                "message_id": self._message_id,
+                "date": datetime.now(),
+                "chat": {"id": chat_id or 0, "type": "private"},
+            },
+            context={"bot": bot},
+        )
+
+    def _result(self, bot: Bot, method: TelegramMethod) -> Any:
+        returning = method.__returning__
+        chat_id = getattr(method, "chat_id", None)
+        if typing.get_origin(returning) is list:
+            return [self._message(bot, chat_id) for _ in getattr(method, "media", [])]
+        if returning is Message or Message in typing.get_args(returning):
+            return self._message(bot, chat_id)
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="bench")
+        return True
@@ -0,0 +1,264 @@
+"""End-to-end load benchmark for the bot's handlers
+
+Builds the real Dispatcher with the user and admin routers on top of an
+in-process FakeSession, feeds synthetic updates through `feed_update` at a
+fixed arrival rate and reports throughput and latency per scenario:
+
+    python -m benchmarks.harness                  # compare with baseline.json
+    python -m benchmarks.harness --save-baseline  # record a new baseline
+
+Latency is measured from each update's scheduled arrival, so a handler
+that falls behind shows up as queueing delay instead of a slower arrival
+rate. The run uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from .fake_session import FakeSession
+
+BASELINE = Path(__file__).with_name("baseline.json")
+SCENARIOS = ("recipe", "all_recipes", "start_deep_link", "broadcast")
+
+
+@dataclass
+class Result:
+    count: int
+    updates_per_s: float
+    p50_ms: float
+    p99_ms: float
+
+
+@lru_cache(maxsize=None)
+def build_dispatcher() -> Dispatcher:
+    """The production router tree; routers can only be attached once"""
+    from bot.routes import admin_router, user_router
+
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(user_router)
+    dp.include_router(admin_router)
+    return dp
+
+
+def make_bot(session: FakeSession) -> Bot:
+    return Bot(
+        token="42:BENCHMARK",
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+def message_update(bot: Bot, update_id: int, user_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+                "text": text,
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def feed_at_rate(
+    dp: Dispatcher,
+    bot: Bot,
+    make_update: Callable[[int], Update],
+    rate: float,
+    count: int,
+) -> Result:
+    """Feed `count` updates at `rate` per second and time each one"""
+    latencies: list[float] = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def feed(update: Update, due: float) -> None:
+        await dp.feed_update(bot, update)
+        latencies.append(loop.time() - due)
+
+    tasks = []
+    for i in range(count):
+        due = start + i / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed(make_update(i), due)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    return Result(
+        count,
+        round(count / elapsed, 1),
+        round(percentile(latencies, 0.5) * 1000, 2),
+        round(percentile(latencies, 0.99) * 1000, 2),
+    )
+
+
+async def seed(recipes: int, members: int) -> None:
+    from bot.database import _insert_users, import_recipes, load_members
+
+    await import_recipes(
+        {"title": f"Recipe {i}", "text": "Mix and bake. " * 20, "image": f"photo-{i}"}
+        for i in range(recipes)
+    )
+    for first in range(1, members + 1, 5000):
+        await _insert_users(list(range(first, min(first + 5000, members + 1))))
+    await load_members()
+
+
+async def run_broadcast_scenario(bot: Bot, session: FakeSession, users: int) -> Result:
+    """One broadcast to every seeded user, unthrottled to time the pipeline"""
+    from aiogram.methods import SendMessage
+
+    from bot.broadcast import run_broadcast
+    from bot.database import create_broadcast_job
+
+    latencies: list[float] = []
+    make_request = session.make_request
+
+    async def timed(bot, method, timeout=None):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method, timeout)
+        finally:
+            if isinstance(method, SendMessage):
+                latencies.append(time.perf_counter() - started)
+
+    session.make_request = timed
+    job = await create_broadcast_job("Benchmark", chat_id=0, total=users)
+    started = time.perf_counter()
+    try:
+        await run_broadcast(bot, job, rate=1e9, concurrency=100, batch_size=1000)
+    finally:
+        session.make_request = make_request
+    elapsed = time.perf_counter() - started
+    return Result(
+        len(latencies),
+        round(len(latencies) / elapsed, 1),
+        round(percentile(latencies, 0.5) * 1000, 2),
+        round(percentile(latencies, 0.99) * 1000, 2),
+    )
+
+
+async def run(args: argparse.Namespace) -> dict[str, Result]:
+    from aiogram.utils.payload import encode_payload
+
+    from bot.config import settings
+    from bot.database import init_db
+    from bot.events import event_log
+
+    await init_db()
+    await seed(args.recipes, args.users)
+    await event_log.start()
+
+    session = FakeSession(latency=args.latency_ms / 1000, jitter=0.2, keep=False)
+    bot = make_bot(session)
+    dp = build_dispatcher()
+    deep_link = f"/start {encode_payload(settings.VALID_CODE)}"
+    members = args.users
+
+    commands = {
+        "recipe": lambda i: message_update(bot, i, 1 + i % members, "/recipe"),
+        "all_recipes": lambda i: message_update(
+            bot, i, 1 + i % members, "/all_recipes"
+        ),
+        # New users, so every update registers someone
+        "start_deep_link": lambda i: message_update(bot, i, members + 1 + i, deep_link),
+    }
+    results = {}
+    for name in args.scenarios:
+        if name == "broadcast":
+            results[name] = await run_broadcast_scenario(bot, session, args.users)
+        else:
+            results[name] = await feed_at_rate(
+                dp, bot, commands[name], args.rate, args.count
+            )
+        print(f"{name:>16}: {asdict(results[name])}", flush=True)
+    await event_log.stop()
+    return results
+
+
+def compare(results: dict[str, Result], baseline: dict, tolerance: float) -> list[str]:
+    """Regressions beyond `tolerance` (a fraction) against the baseline"""
+    problems = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result.updates_per_s < base["updates_per_s"] * (1 - tolerance):
+            problems.append(
+                f"{name}: {result.updates_per_s} updates/s, "
+                f"baseline {base['updates_per_s']}"
+            )
+        if result.p99_ms > base["p99_ms"] * (1 + tolerance):
+            problems.append(
+                f"{name}: p99 {result.p99_ms} ms, baseline {base['p99_ms']}"
+            )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=200, help="updates per second")
+    parser.add_argument("--count", type=int, default=2000, help="updates per scenario")
+    parser.add_argument("--latency-ms", type=float, default=30, help="fake API latency")
+    parser.add_argument("--recipes", type=int, default=200)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    # Before bot modules configure DEBUG logging, which would skew timings
+    logging.basicConfig(level=logging.WARNING)
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tmp.name}/bench.db")
+    os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+    os.environ.setdefault("VALID_CODE", "benchmark")
+    os.environ.setdefault("METRICS_PORT", "0")
+
+    results = asyncio.run(run(args))
+    tmp.cleanup()
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps({k: asdict(v) for k, v in results.items()}, indent=2) + "\n"
+        )
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("No baseline to compare with; run with --save-baseline")
+        return 0
+    problems = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
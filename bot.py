@@ -3,21 +3,37 @@ import logging
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from bot.broadcast import resume_broadcasts
 from bot.config import settings
-from bot.database import init_db
-from bot.routes import user_router, admin_router
+from bot.database import get_catalog, init_db, load_members, verify_members
+from bot.events import event_log
+from bot.metrics import ApiMetricsMiddleware, start_metrics_server
+from bot.middlewares import MetricsMiddleware, ProfilingMiddleware
+from bot.outbound import outbound
+from bot.routes import user_router, admin_router, onboarding
+from bot.webhook import run_webhook
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize bot and dispatcher
+session = None
+if settings.TELEGRAM_API_URL:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
 bot = Bot(
-    token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    token=settings.BOT_TOKEN,
+    session=session,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
 )
+# Outbound pacing wraps the API metrics, so queueing is not counted as latency
+bot.session.middleware(outbound)
+bot.session.middleware(ApiMetricsMiddleware())
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
@@ -25,13 +41,50 @@ dp = Dispatcher(storage=storage)
 dp.include_router(user_router)
 dp.include_router(admin_router)
 
+for observer in (dp.message, dp.callback_query, dp.inline_query):
+    observer.outer_middleware(MetricsMiddleware())
+    observer.outer_middleware(ProfilingMiddleware())
+
+_background: set[asyncio.Task] = set()
+
+
+async def verify_members_periodically():
+    while True:
+        await asyncio.sleep(settings.MEMBER_CACHE_VERIFY_INTERVAL)
+        try:
+            await verify_members()
+        except Exception:
+            logger.exception("Member cache verification failed")
+
 
 async def main():
     logger.info("Initializing database...")
     await init_db()
+    catalog = await get_catalog()
+    logger.info("Recipe cache warmed with %s recipes", len(catalog))
+    logger.info("Member cache loaded with %s users", await load_members())
+    if settings.MEMBER_CACHE_VERIFY_INTERVAL:
+        verifier = asyncio.create_task(verify_members_periodically())
+        _background.add(verifier)
+        verifier.add_done_callback(_background.discard)
+    if settings.METRICS_PORT:
+        await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    await event_log.start()
+    await resume_broadcasts(bot)
+    await onboarding.start(bot)
 
-    logger.info("Starting bot...")
-    await dp.start_polling(bot)
+    try:
+        if settings.DELIVERY_MODE == "webhook":
+            logger.info("Starting bot in webhook mode...")
+            await run_webhook(dp, bot)
+        else:
+            logger.info("Starting bot...")
+            await dp.start_polling(bot)
+    finally:
+        for task in list(_background):
+            task.cancel()
+        await onboarding.stop()
+        await event_log.stop()
 
 
 if __name__ == "__main__":
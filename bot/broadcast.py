@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from .config import settings
+from .database import (
+    BroadcastJob,
+    count_users_after,
+    create_broadcast_job,
+    get_unfinished_broadcast_jobs,
+    iter_user_ids,
+    update_broadcast_job,
+)
+
+logger = logging.getLogger(__name__)
+
+# Strong references to running broadcasts so they are not garbage collected
+_running: set[asyncio.Task] = set()
+
+
+class DeliveryStatus(str, Enum):
+    SENT = "sent"
+    BLOCKED = "blocked"
+    DEACTIVATED = "deactivated"
+    FAILED = "failed"
+
+
+class TokenBucket:
+    """Global send rate limiter shared by all broadcast senders"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (flood control is per bot)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    sent: int = 0
+    blocked: int = 0
+    deactivated: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    # Messages already processed before this run (when resuming a job)
+    resumed_from: int = 0
+
+    @classmethod
+    def from_job(cls, job: BroadcastJob) -> "BroadcastStats":
+        stats = cls(
+            total=job.total,
+            sent=job.sent,
+            blocked=job.blocked,
+            deactivated=job.deactivated,
+            failed=job.failed,
+        )
+        stats.resumed_from = stats.processed
+        return stats
+
+    def record(self, status: DeliveryStatus) -> None:
+        setattr(self, status.value, getattr(self, status.value) + 1)
+
+    def counters(self) -> dict[str, int]:
+        return {status.value: getattr(self, status.value) for status in DeliveryStatus}
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.deactivated + self.failed
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        done = self.processed - self.resumed_from
+        return done / elapsed if elapsed > 0 else 0.0
+
+    def progress(self) -> str:
+        total = max(self.total, self.processed)
+        percent = self.processed * 100 // total if total else 100
+        return f"📤 Обработано: {self.processed}/{total} ({percent}%)"
+
+    def summary(self) -> str:
+        return (
+            f"{self.progress()}\n"
+            f"✅ Доставлено: {self.sent}\n"
+            f"🚫 Заблокировали бота: {self.blocked}\n"
+            f"👻 Удалённые аккаунты: {self.deactivated}\n"
+            f"⚠️ Ошибки: {self.failed}\n"
+            f"⏱ Скорость: {self.rate:.1f} сообщ./с"
+        )
+
+
+def classify_error(error: Exception) -> Optional[DeliveryStatus]:
+    """Map a send error to a final status, or None if it is worth retrying"""
+    if isinstance(error, TelegramForbiddenError):
+        if "deactivated" in error.message.lower():
+            return DeliveryStatus.DEACTIVATED
+        return DeliveryStatus.BLOCKED
+    if isinstance(error, TelegramBadRequest):
+        # Chat not found and friends will not fix themselves
+        return DeliveryStatus.FAILED
+    return None
+
+
+async def deliver(
+    bot: Bot,
+    bucket: TokenBucket,
+    user_id: int,
+    text: str,
+    max_retries: int = settings.BROADCAST_MAX_RETRIES,
+) -> DeliveryStatus:
+    """Send one broadcast message, honoring flood control and retrying transient errors"""
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            await bot.send_message(user_id, text)
+            return DeliveryStatus.SENT
+        except TelegramRetryAfter as e:
+            logger.warning("Flood control hit, sleeping %s s", e.retry_after)
+            bucket.pause(e.retry_after)
+            continue
+        except Exception as e:
+            status = classify_error(e)
+            if status is not None:
+                return status
+            attempt += 1
+            if attempt > max_retries:
+                logger.error("Failed to send message to %s: %s", user_id, e)
+                return DeliveryStatus.FAILED
+            await asyncio.sleep(min(2**attempt, 30))
+
+
+async def _report(bot: Bot, job: BroadcastJob, title: str, stats: BroadcastStats):
+    """Edit the job's status message in place"""
+    if job.status_message_id is None:
+        return
+    try:
+        await bot.edit_message_text(
+            f"{title}\n\n{stats.summary()}",
+            chat_id=job.chat_id,
+            message_id=job.status_message_id,
+        )
+    except TelegramBadRequest as e:
+        # "message is not modified" and deleted status messages are harmless
+        logger.debug("Could not update broadcast status: %s", e)
+
+
+async def run_broadcast(
+    bot: Bot,
+    job: BroadcastJob,
+    rate: float = settings.BROADCAST_RATE_LIMIT,
+    concurrency: int = settings.BROADCAST_CONCURRENCY,
+    batch_size: int = settings.BROADCAST_BATCH_SIZE,
+) -> BroadcastStats:
+    """Deliver a job's text to every user after its checkpoint
+
+    Recipients are streamed in keyset-ordered batches; the checkpoint is
+    saved once a whole batch is processed, so a restart re-sends at most
+    one batch.
+    """
+    bucket = TokenBucket(rate)
+    stats = BroadcastStats.from_job(job)
+    queue: asyncio.Queue[int] = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def sender():
+        while True:
+            user_id = await queue.get()
+            try:
+                stats.record(await deliver(bot, bucket, user_id, job.text))
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(sender()) for _ in range(concurrency)]
+    reported_at = time.monotonic()
+    try:
+        async for batch in iter_user_ids(job.last_user_id, batch_size):
+            for user_id in batch:
+                await queue.put(user_id)
+            await queue.join()
+
+            job.last_user_id = batch[-1]
+            await update_broadcast_job(
+                job.id, last_user_id=job.last_user_id, **stats.counters()
+            )
+            if time.monotonic() - reported_at >= settings.BROADCAST_STATUS_INTERVAL:
+                await _report(bot, job, "⏳ Рассылка идёт...", stats)
+                reported_at = time.monotonic()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    await update_broadcast_job(
+        job.id, finished=True, finished_at=datetime.utcnow(), **stats.counters()
+    )
+    return stats
+
+
+def _spawn(bot: Bot, job: BroadcastJob) -> asyncio.Task:
+    async def runner():
+        try:
+            stats = await run_broadcast(bot, job)
+        except Exception:
+            logger.exception("Broadcast %s crashed", job.id)
+            await bot.send_message(job.chat_id, "❌ Рассылка прервана с ошибкой.")
+            return
+        await _report(bot, job, "Рассылка завершена!", stats)
+
+    task = asyncio.create_task(runner())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
+
+
+async def start_broadcast(bot: Bot, text: str, chat_id: int) -> asyncio.Task:
+    """Persist a new broadcast job and run it in the background"""
+    job = await create_broadcast_job(text, chat_id, total=await count_users_after())
+    status = await bot.send_message(
+        chat_id, f"Рассылка запущена для {job.total} пользователей."
+    )
+    job.status_message_id = status.message_id
+    await update_broadcast_job(job.id, status_message_id=status.message_id)
+    return _spawn(bot, job)
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Restart every broadcast that was interrupted by a shutdown"""
+    for job in await get_unfinished_broadcast_jobs():
+        logger.info("Resuming broadcast %s after user %s", job.id, job.last_user_id)
+        _spawn(bot, job)
@@ -0,0 +1,269 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from collections import OrderedDict
+from itertools import chain
+from random import Random
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from . import metrics
+from .config import settings
+
+_random = Random()
+
+
+@dataclass(frozen=True, slots=True)
+class CachedRecipe:
+    id: int
+    title: str
+    text: str
+    image: str
+    video: Optional[str] = None
+    version: int = 1
+
+
+class RecipeCatalog:
+    """Immutable snapshot of the recipes table, ordered by id"""
+
+    __slots__ = ("recipes", "by_id", "ids", "generation")
+
+    def __init__(self, recipes: Iterable[CachedRecipe], generation: int = 0):
+        self.recipes: tuple[CachedRecipe, ...] = tuple(
+            sorted(recipes, key=lambda r: r.id)
+        )
+        self.by_id: Mapping[int, CachedRecipe] = MappingProxyType(
+            {recipe.id: recipe for recipe in self.recipes}
+        )
+        self.ids = array("q", (recipe.id for recipe in self.recipes))
+        self.generation = generation
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def __bool__(self) -> bool:
+        return bool(self.recipes)
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    def after(self, recipe_id: int, limit: int) -> tuple[CachedRecipe, ...]:
+        """Keyset page: up to `limit` recipes with an id greater than `recipe_id`"""
+        start = bisect_right(self.ids, recipe_id)
+        return self.recipes[start : start + limit]
+
+    def before(self, recipe_id: int, limit: int) -> tuple[CachedRecipe, ...]:
+        """Keyset page: up to `limit` recipes with an id less than `recipe_id`"""
+        end = bisect_left(self.ids, recipe_id)
+        return self.recipes[max(0, end - limit) : end]
+
+    def position(self, recipe_id: int) -> int:
+        return bisect_left(self.ids, recipe_id)
+
+    def random(self, rng: Random = _random) -> Optional[CachedRecipe]:
+        if not self.ids:
+            return None
+        return self.by_id[rng.choice(self.ids)]
+
+
+class RecipeCache:
+    """Holds the current catalog snapshot; writers invalidate it after commit
+
+    `generation` is bumped on every invalidation so a loader that raced with
+    a write can tell its result is already stale and must not be installed.
+    """
+
+    def __init__(self):
+        self._catalog: Optional[RecipeCatalog] = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> Optional[RecipeCatalog]:
+        catalog = self._catalog
+        if catalog is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return catalog
+
+    def swap(self, catalog: RecipeCatalog, generation: int) -> bool:
+        """Install a freshly loaded catalog unless a write happened meanwhile"""
+        if generation != self.generation:
+            return False
+        self._catalog = catalog
+        return True
+
+    def invalidate(self) -> None:
+        self._catalog = None
+        self.generation += 1
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class MemberCache:
+    """Authorized user IDs held in memory for the per-update access check
+
+    In "set" mode IDs live in a plain int set. In "compact" mode they are
+    kept in a sorted array('q') (8 bytes per ID instead of ~60 for a set
+    entry) plus a small set of recent additions that is merged in batches.
+    Once `limit` IDs are held the cache stops growing and is marked
+    incomplete: a miss then means "unknown" rather than "not a member".
+    """
+
+    COMPACT_EVERY = 1024
+
+    def __init__(self, mode: str = "set", limit: int = 0):
+        if mode not in ("set", "compact"):
+            raise ValueError(f"Unknown member cache mode: {mode}")
+        self.mode = mode
+        self.limit = limit
+        self.loaded = False
+        self.complete = False
+        self._set: set[int] = set()
+        self._array = array("q")
+        self._pending: set[int] = set()
+        self._added_during_reload: Optional[list[int]] = None
+
+    def __len__(self) -> int:
+        return len(self._set) + len(self._array) + len(self._pending)
+
+    def __contains__(self, user_id: int) -> bool:
+        if self.mode == "set":
+            return user_id in self._set
+        if user_id in self._pending:
+            return True
+        i = bisect_left(self._array, user_id)
+        return i < len(self._array) and self._array[i] == user_id
+
+    def _full(self) -> bool:
+        return bool(self.limit) and len(self) >= self.limit
+
+    def extend(self, user_ids: Iterable[int]) -> bool:
+        """Bulk-load ascending IDs; returns False once the limit is reached"""
+        for user_id in user_ids:
+            if self._full():
+                return False
+            if self.mode == "set":
+                self._set.add(user_id)
+            else:
+                self._array.append(user_id)
+        return True
+
+    def begin_reload(self) -> None:
+        """Start remembering additions so a concurrent reload does not lose them"""
+        self._added_during_reload = []
+
+    def replace(self, fresh: "MemberCache") -> None:
+        """Install the contents of a freshly loaded cache"""
+        added = self._added_during_reload or ()
+        self._added_during_reload = None
+        self._set, self._array, self._pending = fresh._set, fresh._array, fresh._pending
+        self.complete = fresh.complete
+        self.loaded = True
+        for user_id in added:
+            self.add(user_id)
+
+    def add(self, user_id: int) -> None:
+        if self._added_during_reload is not None:
+            self._added_during_reload.append(user_id)
+        if user_id in self:
+            return
+        if self._full():
+            self.complete = False
+            return
+        if self.mode == "set":
+            self._set.add(user_id)
+            return
+        self._pending.add(user_id)
+        if len(self._pending) >= self.COMPACT_EVERY:
+            self._compact()
+
+    def _compact(self) -> None:
+        merged = array("q", sorted(chain(self._array, self._pending)))
+        self._array = merged
+        self._pending = set()
+
+    def checksum(self) -> tuple[int, int]:
+        """(count, sum of IDs), comparable with the same aggregate over the table"""
+        return len(self), sum(self._set) + sum(self._array) + sum(self._pending)
+
+    def clear(self) -> None:
+        self.replace(MemberCache(self.mode, self.limit))
+        self.loaded = False
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _permute(index: int, size: int, seed: int) -> int:
+    """Image of `index` under a seeded bijection of range(size), in O(1)
+
+    A four-round Feistel network shuffles the smallest power-of-four domain
+    covering `size`; results outside range(size) are fed back in until one
+    lands inside, which keeps the mapping a bijection on range(size).
+    """
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    while True:
+        left, right = index >> half, index & mask
+        for round_ in range(4):
+            mixed = ((right ^ seed) + round_) * 0x9E3779B97F4A7C15 & _MASK64
+            left, right = right, left ^ (mixed ^ mixed >> 29) & mask
+        index = left << half | right
+        if index < size:
+            return index
+
+
+class RecipeDecks:
+    """Per-user "no repeats until exhausted" order over the catalog
+
+    A deck is stored as (seed, position, catalog size) rather than as a
+    shuffled list: the position is mapped through a seeded permutation of
+    the catalog's positions on each draw, so a user costs three ints and a
+    draw costs O(1) however large or sparse the ids are. Edits keep the
+    deck; it reshuffles once exhausted or when recipes are added or
+    deleted, and the least recently used decks are dropped beyond
+    `max_users`.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._decks: OrderedDict[int, tuple[int, int, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._decks)
+
+    def draw(self, user_id: int, catalog: RecipeCatalog) -> Optional[CachedRecipe]:
+        if not catalog:
+            return None
+        seed, position, size = self._decks.pop(user_id, (0, 0, 0))
+        if size != len(catalog) or position >= size:
+            seed, position, size = _random.getrandbits(64), 0, len(catalog)
+
+        recipe = catalog.recipes[_permute(position, size, seed)]
+
+        self._decks[user_id] = (seed, position + 1, size)
+        if len(self._decks) > self.max_users:
+            self._decks.popitem(last=False)
+        return recipe
+
+
+recipe_cache = RecipeCache()
+recipe_decks = RecipeDecks(settings.RANDOM_RECIPE_DECKS_MAX)
+member_cache = MemberCache(settings.MEMBER_CACHE_MODE, settings.MEMBER_CACHE_LIMIT)
+
+metrics.registry.callback_counter(
+    "bot_recipe_cache_hits_total",
+    "Catalog lookups served from memory",
+    lambda: recipe_cache.hits,
+)
+metrics.registry.callback_counter(
+    "bot_recipe_cache_misses_total",
+    "Catalog lookups that had to load from the database",
+    lambda: recipe_cache.misses,
+)
+metrics.registry.gauge(
+    "bot_recipe_decks", "Users with a random-recipe deck", lambda: len(recipe_decks)
+)
@@ -1,17 +1,236 @@
+import asyncio
 import logging
-from datetime import datetime
+import re
+import time
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import date, datetime
+from itertools import islice
 from pathlib import Path
-from typing import Optional, List
+from typing import AsyncIterator, Iterable, Optional, List
 
-from sqlalchemy import String, Integer, DateTime, select, delete
+from sqlalchemy import (
+    event,
+    BigInteger,
+    Boolean,
+    Date,
+    Float,
+    String,
+    Integer,
+    DateTime,
+    func,
+    select,
+    delete,
+    update,
+    literal_column,
+    text as sql_text,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base, Mapped, mapped_column
 
-# Create async engine
-engine = create_async_engine("sqlite+aiosqlite:///data/recipes.db", echo=False)
+from . import metrics, migrations
+from .cache import CachedRecipe, MemberCache, RecipeCatalog, member_cache, recipe_cache
+from .config import settings
+from .delivery import plans
 
-# Create async session factory
+url = make_url(settings.DATABASE_URL)
+IS_SQLITE = url.get_backend_name() == "sqlite"
+DB_PATH = url.database if IS_SQLITE else None
+
+if IS_SQLITE:
+    # Writer engine: a single connection, used by one writer at a time
+    engine = create_async_engine(url, echo=False, pool_size=1, max_overflow=0)
+else:
+    engine = create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+if IS_SQLITE and DB_PATH and DB_PATH != ":memory:":
+    # Reader engine: a small pool of read-only connections that never wait on writes
+    read_engine = create_async_engine(
+        url.set(database=f"file:{DB_PATH}", query={"mode": "ro", "uri": "true"}),
+        echo=False,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=0,
+    )
+else:
+    # Server databases handle concurrent readers and writers on one pool
+    read_engine = engine
+
+
+def _apply_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE:d}")
+    cursor.execute(f"PRAGMA cache_size={settings.DB_CACHE_SIZE:d}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS:d}")
+    cursor.close()
+
+
+def _apply_read_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE:d}")
+    cursor.execute(f"PRAGMA cache_size={settings.DB_CACHE_SIZE:d}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS:d}")
+    cursor.close()
+
+
+QUERY_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def _observe_queries(engine, role: str) -> None:
+    """Time every statement run through `engine` into the query histogram"""
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        kind = statement.lstrip()[:6].upper()
+        metrics.db_query_seconds.observe(
+            time.perf_counter() - context._query_started,
+            role,
+            kind if kind in QUERY_KINDS else "OTHER",
+        )
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before)
+    event.listen(engine.sync_engine, "after_cursor_execute", after)
+
+
+_observe_queries(engine, "writer")
+if read_engine is not engine:
+    _observe_queries(read_engine, "reader")
+
+if IS_SQLITE:
+    event.listen(engine.sync_engine, "connect", _apply_pragmas)
+    if read_engine is not engine:
+        event.listen(read_engine.sync_engine, "connect", _apply_read_pragmas)
+
+# Dialect-specific INSERT with ON CONFLICT support
+insert = sqlite_insert if IS_SQLITE else pg_insert
+
+# Create async session factories
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+read_session = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+# SQLite allows a single writer; serialize writes here instead of on busy_timeout
+_write_lock = asyncio.Lock() if IS_SQLITE else nullcontext()
+
+
+# Session of the unit of work running in the current task, if any
+_current_session: ContextVar[Optional[tuple[asyncio.Task, AsyncSession]]] = ContextVar(
+    "current_session", default=None
+)
+
+
+@asynccontextmanager
+async def write_session() -> AsyncIterator[AsyncSession]:
+    """Session for writes; on SQLite they are serialized, never interleaved"""
+    async with _write_lock:
+        async with async_session() as session:
+            yield session
+
+
+class UnitOfWork:
+    """Write access for one admin update, opened lazily
+
+    Nothing is opened when the update arrives. The session is created on the
+    first `transaction()`, and each transaction takes the writer lock only
+    for its statements, flush and commit. Handlers write first and talk to
+    Telegram afterwards, so the lock is never held across network I/O and
+    registrations, event-log flushes and broadcast checkpoints wait for one
+    short write at most.
+    """
+
+    def __init__(self):
+        self._session: Optional[AsyncSession] = None
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        """Writer lock and transaction for a group of writes, committed on exit
+
+        Helpers writing inside the block join it instead of waiting on the
+        lock it holds: they only flush, and everything commits or rolls back
+        together on exit.
+        """
+        async with _write_lock:
+            if self._session is None:
+                self._session = async_session()
+            session = self._session
+            token = _current_session.set((asyncio.current_task(), session))
+            try:
+                yield session
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+            finally:
+                _current_session.reset(token)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """A lazy UnitOfWork for one update, closed at the end"""
+    uow = UnitOfWork()
+    try:
+        yield uow
+    finally:
+        await uow.close()
+
+
+@asynccontextmanager
+async def _session_scope(
+    session: Optional[AsyncSession] = None,
+) -> AsyncIterator[AsyncSession]:
+    """Use the caller's session (flushed, committed by its owner) or our own
+
+    Without an explicit session, the unit of work running in this task is
+    joined the same way. Tasks spawned from a handler inherit the context
+    but not the session, so they open their own.
+    """
+    current = _current_session.get()
+    if session is None and current is not None:
+        if current[0] is asyncio.current_task():
+            session = current[1]
+    if session is not None:
+        yield session
+        await session.flush()
+        return
+    async with write_session() as own:
+        yield own
+        await own.commit()
+
+
+def _invalidate_recipes_on_commit(
+    session: AsyncSession, deleted: Optional[int] = None
+) -> None:
+    def invalidate(_) -> None:
+        recipe_cache.invalidate()
+        if deleted is not None:
+            # SQLite may hand a deleted id to the next recipe, starting
+            # again at version 1, so its plans must not outlive it
+            plans.discard(deleted)
+
+    event.listen(session.sync_session, "after_commit", invalidate, once=True)
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
 
 # Create declarative base
 Base = declarative_base()
@@ -25,19 +244,153 @@ class Recipe(Base):
     text: Mapped[str] = mapped_column(String)
     image: Mapped[str] = mapped_column(String)
     video: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Bumped on every edit; keys the compiled delivery plans
+    version: Mapped[int] = mapped_column(Integer, default=1)
 
 
 class User(Base):
     __tablename__ = "users"
 
-    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    joined_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    user_id: Mapped[int] = mapped_column(
+        migrations.UserId, primary_key=True, autoincrement=False
+    )
+    joined_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, index=True
+    )
+
+
+class StatCounter(Base):
+    """Running totals maintained in the same transaction as the rows they count"""
+
+    __tablename__ = "stat_counters"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class DailyJoins(Base):
+    """Rollup of User.joined_at per UTC day"""
+
+    __tablename__ = "user_joins_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    joins: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class OnboardingProgress(Base):
+    """Next welcome-sequence step due for a chat (removed once finished)"""
+
+    __tablename__ = "onboarding"
+
+    chat_id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=False
+    )
+    step: Mapped[int] = mapped_column(Integer)
+    # Unix timestamp, so it survives restarts unlike the loop's monotonic clock
+    due_at: Mapped[float] = mapped_column(Float)
+
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    text: Mapped[str] = mapped_column(String)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    status_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    # Checkpoint: every user up to and including last_user_id has been processed
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    deactivated: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    finished: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class EventRecord(Base):
+    """One handled update, written in batches by bot.events.EventLog"""
+
+    __tablename__ = "events"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    recipe_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    command: Mapped[str] = mapped_column(String)
+    latency_ms: Mapped[float] = mapped_column(Float)
+    outcome: Mapped[str] = mapped_column(String)
 
 
 async def init_db():
-    Path("data").mkdir(exist_ok=True)
+    if DB_PATH and DB_PATH != ":memory:":
+        Path(DB_PATH).parent.mkdir(exist_ok=True)
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        version = await conn.run_sync(migrations.upgrade)
+    logging.info("Database schema at version %s", version)
+    async with write_session() as session:
+        if await session.get(StatCounter, "users") is None:
+            await rebuild_stats(session)
+            await session.commit()
+
+
+async def _bump_counter(session: AsyncSession, name: str, delta: int) -> None:
+    statement = insert(StatCounter).values(name=name, value=delta)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[StatCounter.name],
+            set_={"value": StatCounter.value + statement.excluded.value},
+        )
+    )
+
+
+async def _bump_daily_joins(session: AsyncSession, day: date, joins: int) -> None:
+    statement = insert(DailyJoins).values(day=day, joins=joins)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[DailyJoins.day],
+            set_={"joins": DailyJoins.joins + statement.excluded.joins},
+        )
+    )
+
+
+async def rebuild_stats(session: AsyncSession) -> None:
+    """Recompute counters and the daily join rollup from the base tables"""
+    users = await session.scalar(select(func.count()).select_from(User))
+    recipes = await session.scalar(select(func.count()).select_from(Recipe))
+    await session.execute(delete(StatCounter))
+    session.add_all(
+        [
+            StatCounter(name="users", value=users),
+            StatCounter(name="recipes", value=recipes),
+        ]
+    )
+
+    day = func.date(User.joined_at)
+    result = await session.execute(select(day, func.count()).group_by(day))
+    await session.execute(delete(DailyJoins))
+    session.add_all(
+        DailyJoins(
+            day=value if isinstance(value, date) else date.fromisoformat(value),
+            joins=joins,
+        )
+        for value, joins in result
+    )
+
+
+async def get_counters() -> dict[str, int]:
+    async with read_session() as session:
+        result = await session.execute(select(StatCounter.name, StatCounter.value))
+        return dict(result.all())
+
+
+async def get_daily_joins(since: date) -> dict[date, int]:
+    async with read_session() as session:
+        result = await session.execute(
+            select(DailyJoins.day, DailyJoins.joins).where(DailyJoins.day >= since)
+        )
+        return dict(result.all())
 
 
 async def get_session() -> AsyncSession:
@@ -45,67 +398,495 @@ async def get_session() -> AsyncSession:
         return session
 
 
-async def add_user(user_id: int) -> None:
-    async with async_session() as session:
-        exist_user = await session.execute(select(User).where(User.user_id == user_id))
-        logging.info("exist_user = %s", exist_user)
-        if exist_user.scalar_one_or_none():
+async def _insert_users(user_ids: List[int]) -> set[int]:
+    """Insert users in a single statement and return the IDs that were new"""
+    async with _session_scope() as session:
+        result = await session.execute(
+            insert(User)
+            .values([{"user_id": user_id} for user_id in user_ids])
+            .on_conflict_do_nothing(index_elements=[User.user_id])
+            .returning(User.user_id)
+        )
+        inserted = set(result.scalars())
+        if inserted:
+            await _bump_counter(session, "users", len(inserted))
+            await _bump_daily_joins(session, datetime.utcnow().date(), len(inserted))
+    return inserted
+
+
+class RegistrationBatcher:
+    """Write-behind queue coalescing registrations into multi-row inserts
+
+    Registrations arriving within `window` seconds share one INSERT and one
+    commit. Each caller is resumed only after that commit has succeeded.
+    """
+
+    def __init__(self, window: float, max_batch: int = 500):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[int, list[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def register(self, user_id: int) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(user_id, []).append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush
+            )
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: dict[int, list[asyncio.Future]]) -> None:
+        try:
+            inserted = await _insert_users(list(batch))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
             return
-        user = User(user_id=user_id)
-        session.add(user)
-        await session.commit()
+        for user_id, futures in batch.items():
+            for i, future in enumerate(futures):
+                if not future.done():
+                    # Only the first of several concurrent callers "created" the user
+                    future.set_result(user_id in inserted and i == 0)
+
+
+registrations = RegistrationBatcher(settings.REGISTRATION_BATCH_WINDOW_MS / 1000)
+
+
+async def add_user(user_id: int) -> bool:
+    """Register a user idempotently; returns True if the user is new"""
+    if registrations.window > 0:
+        inserted = await registrations.register(user_id)
+    else:
+        inserted = user_id in await _insert_users([user_id])
+    member_cache.add(user_id)
+    return inserted
 
 
 async def get_one_user(user_id: int) -> Optional[User]:
-    async with async_session() as session:
+    async with read_session() as session:
         result = await session.execute(select(User).where(User.user_id == user_id))
         return result.scalar_one_or_none()
 
 
+async def is_member(user_id: int) -> bool:
+    """Access check served from the member cache, falling back to the DB on unknowns"""
+    if user_id in member_cache:
+        return True
+    if member_cache.loaded and member_cache.complete:
+        return False
+    return await get_one_user(user_id) is not None
+
+
+async def load_members() -> int:
+    """(Re)load the member cache from the users table"""
+    member_cache.begin_reload()
+    fresh = MemberCache(member_cache.mode, member_cache.limit)
+    fresh.complete = True
+    async for batch in iter_user_ids(batch_size=10_000):
+        if not fresh.extend(batch):
+            fresh.complete = False
+            break
+    member_cache.replace(fresh)
+    return len(member_cache)
+
+
+async def verify_members() -> bool:
+    """Compare the member cache with the table and reload it on mismatch"""
+    if not member_cache.complete:
+        return True
+    async with read_session() as session:
+        result = await session.execute(
+            select(func.count(), func.coalesce(func.sum(User.user_id), 0))
+        )
+        count, total = result.one()
+    if (count, total) == member_cache.checksum():
+        return True
+    logging.warning("Member cache out of sync with users table, reloading")
+    await load_members()
+    return False
+
+
 async def get_all_users() -> List[int]:
-    async with async_session() as session:
+    async with read_session() as session:
         result = await session.execute(select(User.user_id))
         return [row[0] for row in result.fetchall()]
 
 
+async def iter_user_ids(
+    after_user_id: int = 0, batch_size: int = 500
+) -> AsyncIterator[List[int]]:
+    """Stream user IDs in ascending keyset-paginated batches"""
+    while True:
+        async with read_session() as session:
+            result = await session.execute(
+                select(User.user_id)
+                .where(User.user_id > after_user_id)
+                .order_by(User.user_id)
+                .limit(batch_size)
+            )
+            batch = list(result.scalars())
+        if not batch:
+            return
+        yield batch
+        after_user_id = batch[-1]
+
+
+async def count_users_after(user_id: int = 0) -> int:
+    async with read_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(User).where(User.user_id > user_id)
+        )
+        return result.scalar_one()
+
+
+async def create_broadcast_job(text: str, chat_id: int, total: int) -> BroadcastJob:
+    async with _session_scope() as session:
+        job = BroadcastJob(text=text, chat_id=chat_id, total=total)
+        session.add(job)
+        return job
+
+
+async def get_unfinished_broadcast_jobs() -> List[BroadcastJob]:
+    async with read_session() as session:
+        result = await session.execute(
+            select(BroadcastJob)
+            .where(BroadcastJob.finished.is_(False))
+            .order_by(BroadcastJob.id)
+        )
+        return result.scalars().all()
+
+
+async def update_broadcast_job(job_id: int, **values) -> None:
+    async with _session_scope() as session:
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(**values)
+        )
+
+
+async def save_onboarding(
+    progress: dict[int, tuple[int, float]], finished: set[int]
+) -> None:
+    """Persist welcome-sequence progress for many chats in one transaction"""
+    async with _session_scope() as session:
+        if progress:
+            statement = insert(OnboardingProgress).values(
+                [
+                    {"chat_id": chat_id, "step": step, "due_at": due_at}
+                    for chat_id, (step, due_at) in progress.items()
+                ]
+            )
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[OnboardingProgress.chat_id],
+                    set_={
+                        "step": statement.excluded.step,
+                        "due_at": statement.excluded.due_at,
+                    },
+                )
+            )
+        if finished:
+            await session.execute(
+                delete(OnboardingProgress).where(
+                    OnboardingProgress.chat_id.in_(finished)
+                )
+            )
+
+
+async def get_pending_onboarding() -> List[OnboardingProgress]:
+    async with read_session() as session:
+        result = await session.execute(select(OnboardingProgress))
+        return result.scalars().all()
+
+
+EVENT_COLUMNS = (
+    "created_at",
+    "user_id",
+    "recipe_id",
+    "command",
+    "latency_ms",
+    "outcome",
+)
+
+
+async def insert_events(events: List[tuple]) -> None:
+    """Bulk insert event tuples laid out as EVENT_COLUMNS"""
+    async with _session_scope() as session:
+        await session.execute(
+            insert(EventRecord).values([dict(zip(EVENT_COLUMNS, e)) for e in events])
+        )
+
+
+async def delete_events_before(cutoff: datetime) -> int:
+    async with _session_scope() as session:
+        result = await session.execute(
+            delete(EventRecord).where(EventRecord.created_at < cutoff)
+        )
+    return result.rowcount
+
+
+async def get_top_recipes(since: datetime, limit: int = 5) -> List[tuple[int, int]]:
+    """(recipe_id, times shown) for the most requested recipes since `since`"""
+    shown = func.count().label("shown")
+    async with read_session() as session:
+        result = await session.execute(
+            select(EventRecord.recipe_id, shown)
+            .where(
+                EventRecord.created_at >= since,
+                EventRecord.recipe_id.is_not(None),
+                EventRecord.outcome == "ok",
+            )
+            .group_by(EventRecord.recipe_id)
+            .order_by(shown.desc(), EventRecord.recipe_id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result]
+
+
+async def count_active_users(since: datetime) -> int:
+    async with read_session() as session:
+        return await session.scalar(
+            select(func.count(EventRecord.user_id.distinct())).where(
+                EventRecord.created_at >= since
+            )
+        )
+
+
 async def add_recipe(
-    title: str, text: str, image: str, video: Optional[str] = None
+    title: str,
+    text: str,
+    image: str,
+    video: Optional[str] = None,
+    session: Optional[AsyncSession] = None,
 ) -> Recipe:
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         recipe = Recipe(title=title, text=text, image=image, video=video)
         session.add(recipe)
-        await session.commit()
-        return recipe
+        await _bump_counter(session, "recipes", 1)
+        _invalidate_recipes_on_commit(session)
+    return recipe
 
 
-async def get_recipe(recipe_id: int) -> Optional[Recipe]:
-    async with async_session() as session:
+async def get_recipe(
+    recipe_id: int, session: Optional[AsyncSession] = None
+) -> Optional[Recipe]:
+    if session is not None:
+        return await session.get(Recipe, recipe_id)
+    async with read_session() as session:
         result = await session.execute(select(Recipe).where(Recipe.id == recipe_id))
         return result.scalar_one_or_none()
 
 
+async def get_recipe_titles(
+    anchor: int = 0,
+    limit: int = 10,
+    title_prefix: str = "",
+    backward: bool = False,
+    session: Optional[AsyncSession] = None,
+) -> List[tuple[int, str]]:
+    """Keyset page of (id, title) pairs in id order
+
+    The page starts after `anchor`, or with `backward` ends just before it.
+    With `title_prefix` the cached catalog is filtered in Python instead:
+    SQLite's LIKE and lower() fold only ASCII, so "шок" would never match
+    "Шоколадний кекс".
+    """
+    if title_prefix:
+        prefix = title_prefix.casefold()
+        catalog = await get_catalog()
+        if backward:
+            candidates = reversed(catalog.before(anchor, len(catalog)))
+        else:
+            candidates = iter(catalog.after(anchor, len(catalog)))
+        rows = [
+            (recipe.id, recipe.title)
+            for recipe in islice(
+                (r for r in candidates if r.title.casefold().startswith(prefix)),
+                limit,
+            )
+        ]
+        return rows[::-1] if backward else rows
+
+    query = select(Recipe.id, Recipe.title).limit(limit)
+    if backward:
+        query = query.where(Recipe.id < anchor).order_by(Recipe.id.desc())
+    else:
+        query = query.where(Recipe.id > anchor).order_by(Recipe.id)
+
+    if session is not None:
+        rows = (await session.execute(query)).all()
+    else:
+        async with read_session() as session:
+            rows = (await session.execute(query)).all()
+    rows = [(recipe_id, title) for recipe_id, title in rows]
+    return rows[::-1] if backward else rows
+
+
+async def import_recipes(
+    recipes: Iterable[dict],
+    batch_size: int = 500,
+    session: Optional[AsyncSession] = None,
+) -> int:
+    """Insert recipes with multi-row INSERTs, all in one transaction"""
+    count = 0
+    recipes = iter(recipes)
+    async with _session_scope(session) as session:
+        while batch := list(islice(recipes, batch_size)):
+            await session.execute(insert(Recipe).values(batch))
+            count += len(batch)
+        if count:
+            await _bump_counter(session, "recipes", count)
+            _invalidate_recipes_on_commit(session)
+    return count
+
+
+async def iter_recipe_rows(
+    after_id: int = 0, batch_size: int = 500
+) -> AsyncIterator[List[tuple[str, str, str, Optional[str]]]]:
+    """Stream (title, text, image, video) in keyset-paginated batches by id"""
+    while True:
+        async with read_session() as session:
+            result = await session.execute(
+                select(Recipe.id, Recipe.title, Recipe.text, Recipe.image, Recipe.video)
+                .where(Recipe.id > after_id)
+                .order_by(Recipe.id)
+                .limit(batch_size)
+            )
+            batch = result.all()
+        if not batch:
+            return
+        yield [tuple(row[1:]) for row in batch]
+        after_id = batch[-1].id
+
+
 async def get_all_recipes() -> List[Recipe]:
-    async with async_session() as session:
+    async with read_session() as session:
         result = await session.execute(select(Recipe))
         return result.scalars().all()
 
 
+# Longer queries are cut; every term must match, so more rarely helps
+SEARCH_MAX_TERMS = 8
+
+
+def _search_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+
+async def search_recipes(query: str, limit: int = 10) -> List[int]:
+    """IDs of recipes matching every word of `query` as a prefix, best first"""
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    if IS_SQLITE:
+        # Title hits weigh more than text hits in the bm25 ranking
+        statement = sql_text(
+            "SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH :match "
+            "ORDER BY bm25(recipes_fts, 10.0, 1.0) LIMIT :limit"
+        ).bindparams(match=" ".join(f'"{term}"*' for term in terms), limit=limit)
+    else:
+        vector = literal_column(migrations.PG_SEARCH_VECTOR)
+        tsquery = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in terms))
+        statement = (
+            select(Recipe.id)
+            .where(vector.op("@@")(tsquery))
+            .order_by(func.ts_rank(vector, tsquery).desc(), Recipe.id)
+            .limit(limit)
+        )
+    async with read_session() as session:
+        result = await session.execute(statement)
+        return list(result.scalars())
+
+
+async def get_catalog() -> RecipeCatalog:
+    """Return the cached recipe snapshot, loading it on a miss"""
+    catalog = recipe_cache.get()
+    if catalog is not None:
+        return catalog
+
+    generation = recipe_cache.generation
+    async with read_session() as session:
+        result = await session.execute(
+            select(
+                Recipe.id,
+                Recipe.title,
+                Recipe.text,
+                Recipe.image,
+                Recipe.video,
+                Recipe.version,
+            )
+        )
+        catalog = RecipeCatalog(
+            (CachedRecipe(*row) for row in result), generation=generation
+        )
+    recipe_cache.swap(catalog, generation)
+    return catalog
+
+
 async def update_recipe(
-    recipe_id: int, title: str, text: str, image: str, video: Optional[str] = None
+    recipe_id: int,
+    title: str,
+    text: str,
+    image: str,
+    video: Optional[str] = None,
+    session: Optional[AsyncSession] = None,
 ) -> Optional[Recipe]:
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         recipe = await session.get(Recipe, recipe_id)
         if recipe:
             recipe.title = title
             recipe.text = text
             recipe.image = image
             recipe.video = video
-            await session.commit()
-        return recipe
+            recipe.version += 1
+            _invalidate_recipes_on_commit(session)
+    return recipe
 
 
-async def delete_recipe(recipe_id: int) -> bool:
-    async with async_session() as session:
+RECIPE_FIELDS = ("title", "text", "image", "video")
+
+
+async def update_recipe_field(
+    recipe_id: int,
+    field: str,
+    value: Optional[str],
+    session: Optional[AsyncSession] = None,
+) -> Optional[Recipe]:
+    """Change a single column with one UPDATE ... RETURNING round-trip"""
+    if field not in RECIPE_FIELDS:
+        raise ValueError(f"Unknown recipe field: {field}")
+    async with _session_scope(session) as session:
+        recipe = await session.scalar(
+            update(Recipe)
+            .where(Recipe.id == recipe_id)
+            .values({field: value, "version": Recipe.version + 1})
+            .returning(Recipe),
+            execution_options={"synchronize_session": False},
+        )
+        if recipe:
+            _invalidate_recipes_on_commit(session)
+    return recipe
+
+
+async def delete_recipe(recipe_id: int, session: Optional[AsyncSession] = None) -> bool:
+    async with _session_scope(session) as session:
         result = await session.execute(delete(Recipe).where(Recipe.id == recipe_id))
-        await session.commit()
-        return result.rowcount > 0
+        if result.rowcount:
+            await _bump_counter(session, "recipes", -result.rowcount)
+            _invalidate_recipes_on_commit(session, deleted=recipe_id)
+    return result.rowcount > 0
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.methods import SendMediaGroup, SendMessage, SendPhoto, TelegramMethod
+from aiogram.types import InputMediaPhoto, InputMediaVideo
+
+from . import metrics
+from .cache import CachedRecipe
+
+CAPTION_LIMIT = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class DeliveryPlan:
+    """Everything needed to show one recipe version, built once
+
+    `calls` are the API requests that deliver the whole recipe, addressed to
+    chat 0; `send` replays them for a real chat. `photo` and `video` are the
+    media used when a recipe is shown in place by editing a message. The
+    payload objects are shared between requests and must not be mutated.
+    """
+
+    recipe_id: int
+    version: int
+    caption: str
+    full_text: str
+    photo: InputMediaPhoto
+    video: Optional[InputMediaVideo]
+    calls: tuple[TelegramMethod, ...]
+
+    @property
+    def truncated(self) -> bool:
+        return self.caption != self.full_text
+
+    async def send(self, bot: Bot, chat_id: int) -> None:
+        for call in self.calls:
+            await bot(call.model_copy(update={"chat_id": chat_id}))
+
+
+def compile_plan(recipe: CachedRecipe) -> DeliveryPlan:
+    full_text = f"{recipe.title}\n\n{recipe.text}"
+    # Captions are capped by Telegram; long recipes get the title as caption
+    # and the full text as a separate message.
+    caption = full_text if len(full_text) <= CAPTION_LIMIT else recipe.title
+    photo = InputMediaPhoto(media=recipe.image, caption=caption)
+    video = None
+    if recipe.video:
+        video = InputMediaVideo(media=recipe.video, caption=caption)
+        calls = [
+            SendMediaGroup(
+                chat_id=0,
+                media=[photo, InputMediaVideo(media=recipe.video)],
+                protect_content=True,
+            )
+        ]
+    else:
+        calls = [
+            SendPhoto(
+                chat_id=0, photo=recipe.image, caption=caption, protect_content=True
+            )
+        ]
+    if caption != full_text:
+        calls.append(SendMessage(chat_id=0, text=full_text, protect_content=True))
+    return DeliveryPlan(
+        recipe.id, recipe.version, caption, full_text, photo, video, tuple(calls)
+    )
+
+
+class PlanCache:
+    """Compiled plans keyed by (recipe id, version), least recently used first
+
+    Editing a recipe bumps its version, so an outdated plan is simply never
+    asked for again and ages out.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._plans: OrderedDict[tuple[int, int], DeliveryPlan] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get(self, recipe: CachedRecipe) -> DeliveryPlan:
+        key = (recipe.id, recipe.version)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self.hits += 1
+            self._plans.move_to_end(key)
+            return plan
+        self.misses += 1
+        plan = self._plans[key] = compile_plan(recipe)
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def discard(self, recipe_id: int) -> None:
+        for key in [key for key in self._plans if key[0] == recipe_id]:
+            del self._plans[key]
+
+    def clear(self) -> None:
+        self._plans.clear()
+
+
+plans = PlanCache()
+
+metrics.registry.callback_counter(
+    "bot_plan_cache_hits_total",
+    "Recipe sends with a compiled plan",
+    lambda: plans.hits,
+)
+metrics.registry.callback_counter(
+    "bot_plan_cache_misses_total",
+    "Recipe sends that compiled a plan",
+    lambda: plans.misses,
+)
+metrics.registry.gauge("bot_plan_cache_size", "Compiled plans held", lambda: len(plans))
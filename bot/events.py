@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from . import metrics
+from .config import settings
+from .database import delete_events_before, insert_events
+
+logger = logging.getLogger(__name__)
+
+
+class Tracked:
+    """Details a handler may add to the event recorded for its update"""
+
+    __slots__ = ("recipe_id", "outcome")
+
+    def __init__(self):
+        self.recipe_id: Optional[int] = None
+        self.outcome = "ok"
+
+
+class EventLog:
+    """Bounded in-memory buffer of analytics events, flushed in bulk
+
+    `record` only appends a tuple, so handlers never wait on the database.
+    A background task inserts the buffer every `flush_interval` seconds, or
+    sooner once `flush_size` events are waiting. If the database falls
+    behind and the buffer reaches `capacity`, new events are dropped and
+    counted in `dropped` instead of blocking.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.EVENT_LOG_CAPACITY,
+        flush_interval: float = settings.EVENT_LOG_FLUSH_MS / 1000,
+        flush_size: int = settings.EVENT_LOG_FLUSH_SIZE,
+    ):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._buffer: list[tuple] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(
+        self,
+        user_id: int,
+        command: str,
+        recipe_id: Optional[int] = None,
+        latency_ms: float = 0.0,
+        outcome: str = "ok",
+    ) -> None:
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self._buffer.append(
+            (datetime.utcnow(), user_id, recipe_id, command, latency_ms, outcome)
+        )
+        if len(self._buffer) >= self.flush_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        batch, self._buffer = self._buffer, []
+        try:
+            await insert_events(batch)
+        except Exception:
+            logger.exception("Failed to write %s events", len(batch))
+            self.dropped += len(batch)
+            return 0
+        self.written += len(batch)
+        return len(batch)
+
+    async def start(self) -> None:
+        """Drop events past retention and start the background flusher"""
+        if settings.EVENT_LOG_RETENTION_DAYS:
+            cutoff = datetime.utcnow() - timedelta(
+                days=settings.EVENT_LOG_RETENTION_DAYS
+            )
+            logger.info("Pruned %s old events", await delete_events_before(cutoff))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+event_log = EventLog()
+
+metrics.registry.gauge(
+    "bot_events_buffered", "Events waiting to be written", lambda: len(event_log)
+)
+metrics.registry.callback_counter(
+    "bot_events_dropped_total",
+    "Events lost to a full buffer or failed write",
+    lambda: event_log.dropped,
+)
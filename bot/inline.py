@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+from aiogram.types import InlineQueryResultCachedPhoto
+
+from . import metrics
+from .config import settings
+from .database import get_catalog, search_recipes
+from .delivery import plans
+
+# Telegram accepts at most 50 results per answer
+MAX_RESULTS = 20
+
+
+class InlineResultCache:
+    """Prebuilt inline answers per (catalog generation, normalized query)
+
+    Every keystroke in inline mode is a new query, so each prefix is looked
+    up once and then served from memory. Writes to the catalog bump its
+    generation, which retires every cached answer at once; old entries age
+    out of the LRU.
+    """
+
+    def __init__(self, max_size: int = settings.INLINE_CACHE_SIZE):
+        self.max_size = max_size
+        self._answers: OrderedDict[
+            tuple[int, str], tuple[InlineQueryResultCachedPhoto, ...]
+        ] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    async def get(self, query: str) -> tuple[InlineQueryResultCachedPhoto, ...]:
+        catalog = await get_catalog()
+        normalized = " ".join(query.lower().split())
+        key = (catalog.generation, normalized)
+        answer = self._answers.get(key)
+        if answer is not None:
+            self.hits += 1
+            self._answers.move_to_end(key)
+            return answer
+
+        self.misses += 1
+        if normalized:
+            ids = await search_recipes(normalized, MAX_RESULTS)
+            recipes = [catalog.by_id[i] for i in ids if i in catalog.by_id]
+        else:
+            recipes = catalog.after(0, MAX_RESULTS)
+        answer = tuple(
+            InlineQueryResultCachedPhoto(
+                id=str(recipe.id),
+                photo_file_id=recipe.image,
+                title=recipe.title,
+                caption=plans.get(recipe).caption,
+            )
+            for recipe in recipes
+        )
+        self._answers[key] = answer
+        if len(self._answers) > self.max_size:
+            self._answers.popitem(last=False)
+        return answer
+
+
+inline_results = InlineResultCache()
+
+metrics.registry.callback_counter(
+    "bot_inline_cache_hits_total",
+    "Inline queries answered from memory",
+    lambda: inline_results.hits,
+)
+metrics.registry.callback_counter(
+    "bot_inline_cache_misses_total",
+    "Inline queries that searched the catalog",
+    lambda: inline_results.misses,
+)
+metrics.registry.gauge(
+    "bot_inline_cache_size", "Inline answers held", lambda: len(inline_results)
+)
@@ -0,0 +1,273 @@
+"""In-process metrics with a Prometheus text endpoint
+
+A deliberately small subset of the Prometheus client (counters, histograms,
+and gauges and counters read from callbacks) so the bot needs no extra
+dependency. Everything is updated from the event loop thread, so no locking
+is needed.
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Iterator, Sequence
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (last one is +Inf), sum
+        self.series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def sum(self, *labels: str) -> float:
+        series = self.series.get(labels)
+        return series[1][0] if series else 0.0
+
+    def quantile(self, q: float, *labels: str) -> float:
+        """Upper bound of the bucket holding the q-quantile (an estimate)"""
+        series = self.series.get(labels)
+        if not series:
+            return 0.0
+        counts = series[0]
+        target, seen = q * sum(counts), 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            suffix = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {total[0]}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.read()}"
+
+
+class CallbackCounter(Gauge):
+    """Monotonic total read from a callback, e.g. a cache's hit count"""
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        yield f"{self.name} {self.read()}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self._add(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self._add(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self._add(Gauge(*args, **kwargs))
+
+    def callback_counter(self, *args, **kwargs) -> CallbackCounter:
+        return self._add(CallbackCounter(*args, **kwargs))
+
+    def render(self) -> str:
+        return (
+            "\n".join(
+                line for metric in self.metrics.values() for line in metric.render()
+            )
+            + "\n"
+        )
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+    "bot_handler_seconds", "Update handling time by command", ("command",)
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Updates whose handler raised", ("command",)
+)
+updates_dropped = registry.counter(
+    "bot_updates_dropped_total",
+    "Updates dropped by per-user throttling or coalescing",
+    ("command", "reason"),
+)
+db_query_seconds = registry.histogram(
+    "bot_db_query_seconds",
+    "SQL statement execution time",
+    ("engine", "statement"),
+    buckets=QUERY_BUCKETS,
+)
+api_request_seconds = registry.histogram(
+    "bot_api_request_seconds", "Telegram Bot API call time by method", ("method",)
+)
+api_errors = registry.counter(
+    "bot_api_errors_total",
+    "Failed Bot API calls by method and error",
+    ("method", "error"),
+)
+api_retry_after = registry.counter(
+    "bot_api_retry_after_total", "Bot API calls rejected with 429", ("method",)
+)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Times every Bot API call; register it after the outbound scheduler so
+    that time spent waiting for a send slot is not counted as API latency"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            api_retry_after.inc(name)
+            raise
+        except TelegramAPIError as e:
+            api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_request_seconds.observe(time.perf_counter() - started, name)
+
+
+def _ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:g} мс"
+
+
+def summary() -> str:
+    """Short human-readable digest for the admin /metrics command"""
+    lines = ["⏱ Обработчики (запросов, p50, p99, ошибок):"]
+    for (command,) in sorted(handler_seconds.series):
+        lines.append(
+            f"  {command}: {handler_seconds.count(command)}, "
+            f"{_ms(handler_seconds.quantile(0.5, command))}, "
+            f"{_ms(handler_seconds.quantile(0.99, command))}, "
+            f"{int(handler_errors.values.get((command,), 0))}"
+        )
+    lines.append("\n📡 Telegram API (вызовов, p50, p99, 429):")
+    for (method,) in sorted(api_request_seconds.series):
+        lines.append(
+            f"  {method}: {api_request_seconds.count(method)}, "
+            f"{_ms(api_request_seconds.quantile(0.5, method))}, "
+            f"{_ms(api_request_seconds.quantile(0.99, method))}, "
+            f"{int(api_retry_after.values.get((method,), 0))}"
+        )
+    lines.append("\n🗄 Запросы к БД (запросов, p50, p99):")
+    for labels in sorted(db_query_seconds.series):
+        lines.append(
+            f"  {' '.join(labels)}: {db_query_seconds.count(*labels)}, "
+            f"{_ms(db_query_seconds.quantile(0.5, *labels))}, "
+            f"{_ms(db_query_seconds.quantile(0.99, *labels))}"
+        )
+    lines.append("")
+    for gauge in registry.metrics.values():
+        if isinstance(gauge, Gauge):
+            lines.append(f"{gauge.name}: {gauge.read():g}")
+    return "\n".join(lines)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve the registry at /metrics in Prometheus text format"""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics available on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,189 @@
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject
+
+from . import metrics
+from .database import unit_of_work
+from .events import Tracked, event_log
+from .profiling import profiler
+from .throttling import COMMAND_COSTS, UserThrottle, throttle
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Passes a lazy UnitOfWork as `uow` to handlers flagged `unit_of_work`
+
+    Handlers that only read get nothing and use the read-only engine.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not get_flag(data, "unit_of_work"):
+            return await handler(event, data)
+        async with unit_of_work() as uow:
+            data["uow"] = uow
+            return await handler(event, data)
+
+
+def command_name(event: TelegramObject) -> str:
+    """Short label for an update: command, callback prefix or inline"""
+    if isinstance(event, Message):
+        text = event.text or ""
+        if text.startswith("/"):
+            command, *args = text.split(maxsplit=1)
+            command = command[1:].split("@", 1)[0]
+            return "start_deep_link" if command == "start" and args else command
+        return "message"
+    if isinstance(event, CallbackQuery):
+        return (event.data or "").split(":", 1)[0]
+    if isinstance(event, InlineQuery):
+        return "inline"
+    return type(event).__name__.lower()
+
+
+class EventLogMiddleware(BaseMiddleware):
+    """Records one analytics event per handled update
+
+    Handlers can fill in the recipe and outcome through the `tracked`
+    argument; everything else is derived here.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tracked = data["tracked"] = Tracked()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            tracked.outcome = "error"
+            raise
+        finally:
+            event_log.record(
+                event.from_user.id,
+                command_name(event),
+                tracked.recipe_id,
+                (time.perf_counter() - started) * 1000,
+                tracked.outcome,
+            )
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Outer middleware timing every update, filters included, by command"""
+
+    # Users can send any /command; past this many labels the rest are "other"
+    MAX_COMMANDS = 50
+
+    def __init__(self):
+        self._commands: set[str] = set()
+
+    def _label(self, event: TelegramObject) -> str:
+        command = command_name(event)
+        if command in self._commands:
+            return command
+        if len(self._commands) < self.MAX_COMMANDS:
+            self._commands.add(command)
+            return command
+        return "other"
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        command = self._label(event)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(command)
+            raise
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - started, command)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Outer middleware counting handled updates while /profile runs"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            if profiler.active:
+                profiler.count_update()
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Drops updates beyond a user's token budget, and repeats of a command
+    that is still being delivered to the same user
+
+    Register it after EventLogMiddleware so dropped updates are still
+    logged, with the reason as their outcome.
+    """
+
+    # Commands whose repeat is merged into the delivery already in flight
+    COALESCED = frozenset({"recipe", "all_recipes"})
+
+    def __init__(self, throttle: UserThrottle = throttle):
+        self.throttle = throttle
+        self._in_flight: set[tuple[int, str]] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        command = command_name(event)
+        key = (user.id, command)
+        if key in self._in_flight:
+            self._drop(data, command, "coalesced")
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+
+        cost = COMMAND_COSTS.get(command, 1)
+        if cost and self.throttle.rate:
+            wait, first = self.throttle.take(user.id, cost)
+            if wait:
+                self._drop(data, command, "throttled")
+                notice = f"Забагато запитів. Спробуйте через {math.ceil(wait)} с."
+                if isinstance(event, CallbackQuery):
+                    await event.answer(notice)
+                elif isinstance(event, Message) and first:
+                    await event.answer(notice)
+                return None
+
+        if command not in self.COALESCED:
+            return await handler(event, data)
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+
+    @staticmethod
+    def _drop(data: Dict[str, Any], command: str, reason: str) -> None:
+        metrics.updates_dropped.inc(command, reason)
+        tracked = data.get("tracked")
+        if tracked is not None:
+            tracked.outcome = reason
@@ -0,0 +1,205 @@
+"""Versioned schema migrations
+
+Each migration is a function taking a synchronous SQLAlchemy connection.
+Migrations are applied in order and the last applied version is stored in
+the `schema_version` table. Table definitions inside a migration are frozen
+copies, never the ORM models, so that old migrations keep producing the
+same schema after the models change. Append new migrations at the end;
+never edit or reorder ones that have shipped.
+"""
+
+import logging
+from typing import Callable
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    text,
+)
+
+logger = logging.getLogger(__name__)
+
+# Telegram IDs need 64 bits; on SQLite keep INTEGER so user_id stays the rowid
+UserId = BigInteger().with_variant(Integer, "sqlite")
+
+MIGRATIONS: list[Callable[[Connection], None]] = []
+
+version_table = Table(
+    "schema_version", MetaData(), Column("version", Integer, primary_key=True)
+)
+
+
+def migration(func: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    MIGRATIONS.append(func)
+    return func
+
+
+def current_version(conn: Connection) -> int:
+    version_table.create(conn, checkfirst=True)
+    return conn.scalar(select(version_table.c.version)) or 0
+
+
+def upgrade(conn: Connection) -> int:
+    """Apply every pending migration and return the resulting version"""
+    version = current_version(conn)
+    for number, func in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        logger.info("Applying migration %s: %s", number, func.__name__)
+        func(conn)
+        conn.execute(version_table.delete())
+        conn.execute(version_table.insert().values(version=number))
+        version = number
+    return version
+
+
+@migration
+def initial_schema(conn: Connection) -> None:
+    # Databases created before migrations existed already have some of these
+    # tables, so everything here is created only if missing.
+    metadata = MetaData()
+    Table(
+        "recipes",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", String, nullable=False),
+        Column("text", String, nullable=False),
+        Column("image", String, nullable=False),
+        Column("video", String, nullable=True),
+    )
+    users = Table(
+        "users",
+        metadata,
+        Column("user_id", UserId, primary_key=True, autoincrement=False),
+        Column("joined_at", DateTime, nullable=False),
+    )
+    Table(
+        "broadcast_jobs",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("text", String, nullable=False),
+        Column("chat_id", BigInteger, nullable=False),
+        Column("status_message_id", Integer, nullable=True),
+        Column("total", Integer, nullable=False),
+        Column("last_user_id", BigInteger, nullable=False),
+        Column("sent", Integer, nullable=False),
+        Column("blocked", Integer, nullable=False),
+        Column("deactivated", Integer, nullable=False),
+        Column("failed", Integer, nullable=False),
+        Column("finished", Boolean, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("finished_at", DateTime, nullable=True),
+    )
+    Table(
+        "stat_counters",
+        metadata,
+        Column("name", String, primary_key=True),
+        Column("value", Integer, nullable=False),
+    )
+    Table(
+        "user_joins_daily",
+        metadata,
+        Column("day", Date, primary_key=True),
+        Column("joins", Integer, nullable=False),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+    index = Index("ix_users_joined_at", users.c.joined_at)
+    existing = {i["name"] for i in inspect(conn).get_indexes("users")}
+    if index.name not in existing:
+        index.create(conn)
+
+
+@migration
+def onboarding_progress(conn: Connection) -> None:
+    Table(
+        "onboarding",
+        MetaData(),
+        Column("chat_id", BigInteger, primary_key=True, autoincrement=False),
+        Column("step", Integer, nullable=False),
+        Column("due_at", Float, nullable=False),
+    ).create(conn)
+
+
+@migration
+def recipe_version(conn: Connection) -> None:
+    conn.execute(
+        text("ALTER TABLE recipes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    )
+
+
+# Expression behind the PostgreSQL search index; queries must use it verbatim
+PG_SEARCH_VECTOR = "to_tsvector('simple', title || ' ' || text)"
+
+
+@migration
+def recipe_search(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        conn.execute(
+            text(
+                f"CREATE INDEX ix_recipes_search ON recipes USING gin ({PG_SEARCH_VECTOR})"
+            )
+        )
+        return
+    # External-content FTS5 index over recipes, maintained by triggers so
+    # every write path (including raw SQL) stays in sync.
+    for statement in (
+        """
+        CREATE VIRTUAL TABLE recipes_fts USING fts5(
+            title, text, content='recipes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER recipes_fts_insert AFTER INSERT ON recipes BEGIN
+            INSERT INTO recipes_fts(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END
+        """,
+        """
+        CREATE TRIGGER recipes_fts_delete AFTER DELETE ON recipes BEGIN
+            INSERT INTO recipes_fts(recipes_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+        END
+        """,
+        """
+        CREATE TRIGGER recipes_fts_update AFTER UPDATE OF title, text ON recipes
+        BEGIN
+            INSERT INTO recipes_fts(recipes_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+            INSERT INTO recipes_fts(rowid, title, text)
+            VALUES (new.id, new.title, new.text);
+        END
+        """,
+        "INSERT INTO recipes_fts(recipes_fts) VALUES ('rebuild')",
+    ):
+        conn.execute(text(statement))
+
+
+@migration
+def event_log(conn: Connection) -> None:
+    events = Table(
+        "events",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+        Column("user_id", BigInteger, nullable=False),
+        Column("recipe_id", Integer, nullable=True),
+        Column("command", String, nullable=False),
+        Column("latency_ms", Float, nullable=False),
+        Column("outcome", String, nullable=False),
+    )
+    events.create(conn)
+    Index("ix_events_created_at", events.c.created_at).create(conn)
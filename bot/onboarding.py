@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from .database import get_pending_onboarding, save_onboarding
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Step:
+    """One message of a sequence, sent `delay` seconds after the previous one"""
+
+    kind: str  # "message" or "video_note"
+    payload: str
+    delay: float = 0.0
+
+
+class OnboardingScheduler:
+    """Runs step sequences for many chats from a single timer heap
+
+    Each in-flight sequence costs one (due_at, chat_id, step) heap entry;
+    handlers only enqueue and return. Progress is written to the database
+    in batches every `flush_interval` seconds and reloaded on start, so a
+    restart resumes each chat at its next step.
+    """
+
+    def __init__(
+        self,
+        steps: Sequence[Step],
+        concurrency: int = 32,
+        flush_interval: float = 1.0,
+    ):
+        self.steps = tuple(steps)
+        self.flush_interval = flush_interval
+        self._heap: list[tuple[float, int, int]] = []
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._dirty: dict[int, tuple[int, float]] = {}
+        self._finished: set[int] = set()
+        self._active: set[int] = set()
+        self._bot: Optional[Bot] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def begin(self, chat_id: int) -> None:
+        """Start the sequence for a chat; returns immediately"""
+        if self.steps and chat_id not in self._active:
+            self._active.add(chat_id)
+            self._schedule(chat_id, 0, time.time() + self.steps[0].delay)
+
+    def _schedule(self, chat_id: int, step: int, due_at: float) -> None:
+        heapq.heappush(self._heap, (due_at, chat_id, step))
+        self._dirty[chat_id] = (step, due_at)
+        self._finished.discard(chat_id)
+        self._wakeup.set()
+
+    def _finish(self, chat_id: int) -> None:
+        self._active.discard(chat_id)
+        self._dirty.pop(chat_id, None)
+        self._finished.add(chat_id)
+
+    async def start(self, bot: Bot) -> None:
+        """Reload unfinished sequences and start the timer and flusher"""
+        self._bot = bot
+        for row in await get_pending_onboarding():
+            if row.step < len(self.steps):
+                heapq.heappush(self._heap, (row.due_at, row.chat_id, row.step))
+                self._active.add(row.chat_id)
+            else:
+                self._finished.add(row.chat_id)
+        logger.info("Resumed %s onboarding sequences", len(self._heap))
+        self._spawn(self._run())
+        self._spawn(self._flush_periodically())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            due_at, chat_id, step = self._heap[0]
+            delay = due_at - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            await self._slots.acquire()
+            self._spawn(self._run_step(chat_id, step))
+
+    async def _run_step(self, chat_id: int, step: int) -> None:
+        try:
+            await self._send(chat_id, self.steps[step])
+        except TelegramRetryAfter as e:
+            self._schedule(chat_id, step, time.time() + e.retry_after)
+            return
+        except TelegramForbiddenError:
+            self._finish(chat_id)
+            return
+        except Exception:
+            logger.exception("Onboarding step %s failed for %s", step, chat_id)
+        finally:
+            self._slots.release()
+
+        step += 1
+        if step < len(self.steps):
+            self._schedule(chat_id, step, time.time() + self.steps[step].delay)
+        else:
+            self._finish(chat_id)
+
+    async def _send(self, chat_id: int, step: Step) -> None:
+        if step.kind == "video_note":
+            await self._bot.send_video_note(chat_id, step.payload, protect_content=True)
+        else:
+            await self._bot.send_message(chat_id, step.payload)
+
+    async def flush(self) -> None:
+        if not self._dirty and not self._finished:
+            return
+        dirty, self._dirty = self._dirty, {}
+        finished, self._finished = self._finished, set()
+        try:
+            await save_onboarding(dirty, finished)
+        except Exception:
+            logger.exception("Failed to save onboarding progress")
+            # Keep newer progress recorded meanwhile, retry the rest next time
+            self._dirty = {**dirty, **self._dirty}
+            self._finished |= finished - self._dirty.keys()
+
+    async def stop(self) -> None:
+        """Cancel the timer and in-flight steps, then save progress"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    ForwardMessage,
+    Response,
+    SendAnimation,
+    SendAudio,
+    SendDocument,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendSticker,
+    SendVideo,
+    SendVideoNote,
+    SendVoice,
+    TelegramMethod,
+)
+from aiogram.methods.base import TelegramType
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Methods that count against Telegram's message limits; everything else
+# (edits, callbacks, getMe...) is passed through unpaced.
+PACED_METHODS = (
+    SendMessage,
+    SendPhoto,
+    SendVideo,
+    SendVideoNote,
+    SendAnimation,
+    SendAudio,
+    SendDocument,
+    SendSticker,
+    SendVoice,
+    SendMediaGroup,
+    CopyMessage,
+    ForwardMessage,
+)
+
+ChatId = Union[int, str]
+
+
+class Bucket:
+    """Token bucket driven by the caller's clock; tokens may go negative"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens (capped at the burst) are available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        missing = min(cost, self.burst) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, cost: float) -> None:
+        # A media group bigger than the burst leaves the bucket in debt,
+        # which delays the next message instead of refusing this one.
+        self.tokens -= cost
+
+    def pause(self, seconds: float, now: float) -> None:
+        self.wait(0, now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Paces every outgoing message through one fair queue
+
+    Registered on the bot session, so handlers, broadcasts and onboarding
+    all share it. Each chat has its own token bucket (private chats allow a
+    short burst then ~1 message per second, groups 20 per minute) and all
+    chats share a global bucket. Waiting chats are served round-robin, so
+    one user reading the whole catalog cannot starve everyone else. A media
+    group costs one token per item.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = settings.OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = settings.OUTBOUND_CHAT_RATE,
+        chat_burst: float = settings.OUTBOUND_CHAT_BURST,
+        group_per_minute: float = settings.OUTBOUND_GROUP_PER_MINUTE,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_minute / 60
+        self._global = Bucket(global_rate, global_rate, time.monotonic())
+        self._buckets: dict[ChatId, Bucket] = {}
+        self._queues: dict[ChatId, deque[tuple[int, asyncio.Future, float]]] = {}
+        self._ring: deque[ChatId] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.waiting = 0
+        self.granted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @staticmethod
+    def cost(method: TelegramMethod) -> int:
+        if not isinstance(method, PACED_METHODS):
+            return 0
+        if isinstance(method, SendMediaGroup):
+            return len(method.media)
+        return 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        cost = self.cost(method)
+        if cost:
+            await self.acquire(method.chat_id, cost)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # Flood control applies to the whole bot, so hold every chat
+            logger.warning("Flood control hit, pausing sends for %ss", e.retry_after)
+            self._global.pause(e.retry_after, time.monotonic())
+            raise
+
+    async def acquire(self, chat_id: ChatId, cost: int = 1) -> None:
+        """Wait for this chat's turn to send a message costing `cost`"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._task.get_loop() is not loop:
+            # Waiters of a previous event loop can never be served
+            self._queues.clear()
+            self._ring.clear()
+            self.waiting = 0
+            self._task = None
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._dispatch())
+        future = loop.create_future()
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+            self._ring.append(chat_id)
+        queue.append((cost, future, time.monotonic()))
+        self.waiting += 1
+        self._wakeup.set()
+        await future
+
+    def _bucket(self, chat_id: ChatId, now: float) -> Bucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = Bucket(self.group_rate, 1, now)
+            else:
+                bucket = Bucket(self.chat_rate, self.chat_burst, now)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _grant_next(self, now: float) -> float:
+        """Release at most one waiter; return how long nobody can be served"""
+        idle = float("inf")
+        for _ in range(len(self._ring)):
+            chat_id = self._ring.popleft()
+            queue = self._queues[chat_id]
+            while queue and queue[0][1].done():  # cancelled while waiting
+                queue.popleft()
+                self.waiting -= 1
+            granted = False
+            if queue:
+                cost, future, enqueued_at = queue[0]
+                bucket = self._bucket(chat_id, now)
+                wait = max(bucket.wait(cost, now), self._global.wait(cost, now))
+                if wait == 0:
+                    queue.popleft()
+                    bucket.take(cost)
+                    self._global.take(cost)
+                    future.set_result(None)
+                    self._record(now - enqueued_at)
+                    granted = True
+                else:
+                    idle = min(idle, wait)
+            if queue:
+                self._ring.append(chat_id)
+            else:
+                del self._queues[chat_id]
+            if granted:
+                return 0.0
+        return idle
+
+    def _record(self, waited: float) -> None:
+        self.waiting -= 1
+        self.granted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def _forget_idle_buckets(self, now: float) -> None:
+        # A bucket untouched for a while has refilled; dropping it is lossless
+        for chat_id, bucket in list(self._buckets.items()):
+            if chat_id not in self._queues and now - bucket.updated > 60:
+                del self._buckets[chat_id]
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._ring:
+                if len(self._buckets) > 10_000:
+                    self._forget_idle_buckets(time.monotonic())
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            idle = self._grant_next(time.monotonic())
+            if idle == 0:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), idle)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queue_depth": self.waiting,
+            "waiting_chats": len(self._queues),
+            "granted": self.granted,
+            "wait_avg": self.wait_total / self.granted if self.granted else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+outbound = OutboundScheduler()
+
+metrics.registry.gauge(
+    "bot_outbound_queue_depth",
+    "Messages waiting for a send slot",
+    lambda: outbound.waiting,
+)
+metrics.registry.gauge(
+    "bot_outbound_wait_max_seconds",
+    "Longest wait for a send slot so far",
+    lambda: outbound.wait_max,
+)
+metrics.registry.gauge(
+    "bot_outbound_wait_avg_seconds",
+    "Average wait for a send slot so far",
+    lambda: outbound.stats()["wait_avg"],
+)
+metrics.registry.callback_counter(
+    "bot_outbound_granted_total",
+    "Sends that have been given a slot",
+    lambda: outbound.granted,
+)
+metrics.registry.callback_counter(
+    "bot_outbound_wait_seconds_total",
+    "Time sends spent waiting for a slot",
+    lambda: outbound.wait_total,
+)
+metrics.registry.gauge(
+    "bot_outbound_waiting_chats",
+    "Chats with messages waiting for a slot",
+    lambda: outbound.stats()["waiting_chats"],
+)
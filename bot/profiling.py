@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from types import FrameType
+
+from aiogram import Bot
+from aiogram.types import FSInputFile
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Only tasks suspended inside the routers are sampled, i.e. update handlers;
+# polling, broadcasts and flushers spend their lives waiting and would drown
+# everything else.
+HANDLER_DIR = str(Path(__file__).with_name("routes"))
+
+_running: set[asyncio.Task] = set()
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    for root in sorted(sys.path, key=len, reverse=True):
+        if root and filename.startswith(root):
+            return filename[len(root) :].lstrip("/\\")
+    return filename
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({_short_path(code.co_filename)})"
+
+
+def _coroutine_frames(task: asyncio.Task) -> tuple[list[FrameType], str]:
+    """Frames of a suspended task, outermost first, and what it waits on
+
+    A task awaiting nothing is runnable and only waiting for the loop to
+    get to it, which is reported as `[ready]`.
+    """
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = awaitable.cr_await
+    return frames, "[ready]" if awaitable is None else f"[{type(awaitable).__name__}]"
+
+
+class Profiler:
+    """Statistical sampler for the event loop and the handlers it runs
+
+    While active, a daemon thread wakes every `interval` seconds and counts
+    two kinds of stacks: what the loop thread is executing right now
+    (`[running]`, or `[idle]` while it waits in select), and the suspended
+    coroutine chain of every task inside a handler (`[await]`), which is
+    where time spent waiting on the database or the Bot API shows up.
+    Stacks are written in the collapsed format read by flamegraph.pl and
+    speedscope. When off there is no thread and no hook; the only cost is
+    one flag check per update in ProfilingMiddleware.
+    """
+
+    def __init__(self, interval: float, directory: str):
+        self.interval = interval
+        self.directory = Path(directory)
+        self.active = False
+        self.updates = 0
+        self.samples: Counter[str] = Counter()
+        self._update_limit = 0
+        self._done = asyncio.Event()
+
+    def count_update(self) -> None:
+        self.updates += 1
+        if self._update_limit and self.updates >= self._update_limit:
+            self._done.set()
+
+    async def profile(self, seconds: float, updates: int = 0) -> Path:
+        """Sample for `seconds`, or until `updates` more updates are handled"""
+        if self.active:
+            raise RuntimeError("Profiling is already running")
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_until,
+            args=(loop, threading.get_ident(), stop),
+            name="profiler",
+            daemon=True,
+        )
+        self.samples = Counter()
+        self.updates = 0
+        self._update_limit = updates
+        self._done = asyncio.Event()
+        self.active = True
+        sampler.start()
+        try:
+            await asyncio.wait_for(self._done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.active = False
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+        return await asyncio.to_thread(self._write)
+
+    def _sample_until(
+        self, loop: asyncio.AbstractEventLoop, thread_id: int, stop: threading.Event
+    ) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self._sample(loop, thread_id)
+            except Exception:  # the loop mutates what we walk; skip the tick
+                logger.debug("Profiler sample failed", exc_info=True)
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None and frame.f_code.co_filename.endswith("selectors.py"):
+            self.samples["[idle]"] += 1
+        elif frame is not None:
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame))
+                frame = frame.f_back
+            self.samples[";".join(["[running]", *reversed(stack)])] += 1
+
+        running = asyncio.current_task(loop)
+        for task in asyncio.all_tasks(loop):
+            if task is running:
+                continue
+            frames, awaiting = _coroutine_frames(task)
+            if any(f.f_code.co_filename.startswith(HANDLER_DIR) for f in frames):
+                labels = [_label(f) for f in frames]
+                self.samples[";".join(["[await]", *labels, awaiting])] += 1
+
+    def _write(self) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed"
+        with path.open("w", encoding="utf-8") as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = Profiler(settings.PROFILE_INTERVAL_MS / 1000, settings.PROFILE_DIR)
+
+
+def start_profile(
+    bot: Bot, chat_id: int, seconds: float, updates: int = 0
+) -> asyncio.Task:
+    """Profile in the background and send the result to `chat_id`"""
+
+    async def runner():
+        try:
+            path = await profiler.profile(seconds, updates)
+        except Exception:
+            logger.exception("Profiling failed")
+            await bot.send_message(chat_id, "❌ Профилирование прервано с ошибкой.")
+            return
+        await bot.send_document(
+            chat_id,
+            FSInputFile(path),
+            caption=(
+                f"Профиль: {sum(profiler.samples.values())} сэмплов, "
+                f"{profiler.updates} обновлений. Сохранён в {path}"
+            ),
+        )
+
+    task = asyncio.create_task(runner())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
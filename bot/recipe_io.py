@@ -0,0 +1,113 @@
+"""Recipe files for bulk import and export: JSONL (one object per line) or
+CSV with a header row, both with the columns title, text, image, video.
+
+`image` and `video` are Telegram file_ids, so a file exported from one bot
+only imports cleanly into the same bot.
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Sequence
+
+FIELDS = ("title", "text", "image", "video")
+REQUIRED = ("title", "text", "image")
+
+
+def file_format(path: Path) -> str:
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+def validate(raw: object) -> dict:
+    """Normalize one record or raise ValueError with a readable reason"""
+    if not isinstance(raw, dict):
+        raise ValueError("ожидается объект с полями title, text, image")
+    recipe = {}
+    for field in FIELDS:
+        value = raw.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"поле {field} должно быть строкой")
+        value = (value or "").strip()
+        if not value and field in REQUIRED:
+            raise ValueError(f"нет поля {field}")
+        recipe[field] = value or None
+    return recipe
+
+
+NOT_UTF8 = "файл должен быть текстом в кодировке UTF-8"
+
+
+def _decoded(lines: Iterable[bytes]) -> Iterator[str]:
+    for number, line in enumerate(lines, start=1):
+        yield line.decode("utf-8-sig" if number == 1 else "utf-8")
+
+
+def iter_records(path: Path) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, recipe, None) or (line number, None, error) lazily
+
+    Undecodable JSONL lines are reported like any invalid line; a CSV file
+    that is not UTF-8 or not parseable ends with one error where it broke.
+    """
+    with path.open("rb") as file:
+        if file_format(path) == "csv":
+            reader = csv.DictReader(_decoded(file))
+            try:
+                missing = set(REQUIRED) - set(reader.fieldnames or ())
+                if missing:
+                    yield 1, None, f"в заголовке нет колонок: {', '.join(sorted(missing))}"
+                    return
+                for row in reader:
+                    try:
+                        yield reader.line_num, validate(row), None
+                    except ValueError as e:
+                        yield reader.line_num, None, str(e)
+            except UnicodeDecodeError:
+                yield reader.line_num + 1, None, NOT_UTF8
+            except csv.Error as e:
+                yield reader.line_num + 1, None, f"некорректный CSV: {e}"
+            return
+
+        for line_no, line in enumerate(file, start=1):
+            try:
+                line = line.decode("utf-8-sig" if line_no == 1 else "utf-8")
+            except UnicodeDecodeError:
+                yield line_no, None, NOT_UTF8
+                continue
+            if not line.strip():
+                continue
+            try:
+                yield line_no, validate(json.loads(line)), None
+            except ValueError as e:  # includes json.JSONDecodeError
+                yield line_no, None, str(e)
+
+
+def find_errors(path: Path, limit: int = 20) -> list[tuple[int, str]]:
+    """Validate the whole file without keeping it in memory"""
+    errors = []
+    for line_no, _, error in iter_records(path):
+        if error is not None:
+            errors.append((line_no, error))
+            if len(errors) >= limit:
+                break
+    return errors
+
+
+class RecordWriter:
+    """Writes (title, text, image, video) rows as they arrive"""
+
+    def __init__(self, file: IO[str], fmt: str):
+        self.file = file
+        self.fmt = fmt
+        self.count = 0
+        if fmt == "csv":
+            self._csv = csv.writer(file)
+            self._csv.writerow(FIELDS)
+
+    def write(self, rows: Iterable[Sequence]) -> None:
+        for row in rows:
+            if self.fmt == "csv":
+                self._csv.writerow(row)
+            else:
+                record = dict(zip(FIELDS, row))
+                self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += 1
@@ -1,4 +1,4 @@
 from .admin import admin_router
-from .user import user_router
+from .user import onboarding, user_router
 
-__all__ = ["user_router", "admin_router"]
+__all__ = ["user_router", "admin_router", "onboarding"]
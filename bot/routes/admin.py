@@ -1,24 +1,40 @@
-import asyncio
-import logging
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
 
 from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.deep_linking import create_start_link
 
+from .. import metrics, recipe_io
+from ..broadcast import start_broadcast
 from ..config import settings
 from ..database import (
-    get_all_users,
-    get_all_recipes,
+    get_catalog,
+    count_active_users,
+    get_counters,
+    get_daily_joins,
     add_recipe,
-    update_recipe,
+    update_recipe_field,
     delete_recipe,
     get_recipe,
+    get_recipe_titles,
+    get_top_recipes,
+    import_recipes,
+    iter_recipe_rows,
+    UnitOfWork,
 )
+from ..middlewares import DbSessionMiddleware
+from ..profiling import profiler, start_profile
 
 admin_router = Router()
+admin_router.message.middleware(DbSessionMiddleware())
+admin_router.callback_query.middleware(DbSessionMiddleware())
 
 
 class RecipeStates(StatesGroup):
@@ -30,12 +46,32 @@ class RecipeStates(StatesGroup):
     select_recipe = State()
     select_field = State()
     edit_field = State()
+    waiting_for_import = State()
 
 
 recipe_data = {}
 
+RECIPES_PER_PAGE = 10
 
-def is_admin(message: types.Message) -> bool:
+
+# Callback payloads carry a version in the prefix so that buttons left in
+# old messages stop matching instead of being misread after a change.
+class RecipePageCallback(CallbackData, prefix="admin_page_v1"):
+    action: str  # "delete" or "edit"
+    anchor: int
+    backward: bool = False
+
+
+class RecipePickCallback(CallbackData, prefix="admin_pick_v1"):
+    action: str
+    recipe_id: int
+
+
+class RecipeFieldCallback(CallbackData, prefix="admin_field_v1"):
+    field: str
+
+
+def is_admin(message: types.Message | types.CallbackQuery) -> bool:
     return message.from_user.id in settings.ADMIN_IDS
 
 
@@ -50,11 +86,15 @@ async def cmd_admin_help(message: types.Message, state: FSMContext):
 🔑 Команды администратора:
 
 /add_recipe - Добавить новый рецепт
-/edit_recipe - Редактировать существующий рецепт
-/delete_recipe - Удалить рецепт
+/edit_recipe [начало названия] - Редактировать существующий рецепт
+/delete_recipe [начало названия] - Удалить рецепт
 /list_recipes - Список всех рецептов
+/import_recipes - Загрузить рецепты из файла JSONL или CSV
+/export_recipes [csv] - Выгрузить все рецепты в файл
 /broadcast - Отправить сообщение всем пользователям
 /stats - Статистика пользователей
+/metrics - Задержки обработчиков, Telegram API и БД
+/profile [секунд | N updates] - Профилировать бота (по умолчанию 30 секунд)
 /get_deep_link - Получить ссылку на бот
 """
     await message.answer(help_text)
@@ -114,30 +154,38 @@ async def request_video(callback: types.CallbackQuery):
     await callback.message.answer("Отправьте видео:")
 
 
-@admin_router.callback_query(RecipeStates.waiting_for_video, F.data == "skip_video")
-async def skip_video(callback: types.CallbackQuery, state: FSMContext):
+@admin_router.callback_query(
+    RecipeStates.waiting_for_video,
+    F.data == "skip_video",
+    flags={"unit_of_work": True},
+)
+async def skip_video(callback: types.CallbackQuery, state: FSMContext, uow: UnitOfWork):
     """Skip video addition and finish recipe creation"""
-    await finish_recipe_creation(callback.message, state)
+    await finish_recipe_creation(callback.message, state, uow)
 
 
-@admin_router.message(RecipeStates.waiting_for_video)
-async def process_video(message: types.Message, state: FSMContext):
+@admin_router.message(RecipeStates.waiting_for_video, flags={"unit_of_work": True})
+async def process_video(message: types.Message, state: FSMContext, uow: UnitOfWork):
     """Process the recipe video"""
     if message.video_note:
         recipe_data["video"] = message.video_note.file_id
     if message.video:
         recipe_data["video"] = message.video.file_id
-    await finish_recipe_creation(message, state)
+    await finish_recipe_creation(message, state, uow)
 
 
-async def finish_recipe_creation(message: types.Message, state: FSMContext):
+async def finish_recipe_creation(
+    message: types.Message, state: FSMContext, uow: UnitOfWork
+):
     """Finish recipe creation and save to database"""
-    recipe = await add_recipe(
-        title=recipe_data["title"],
-        text=recipe_data["text"],
-        image=recipe_data["image"],
-        video=recipe_data.get("video"),
-    )
+    async with uow.transaction() as session:
+        recipe = await add_recipe(
+            title=recipe_data["title"],
+            text=recipe_data["text"],
+            image=recipe_data["image"],
+            video=recipe_data.get("video"),
+            session=session,
+        )
 
     await message.answer(
         f"✅ Рецепт успешно добавлен!\n\n"
@@ -156,7 +204,7 @@ async def cmd_list_recipes(message: types.Message):
     if not is_admin(message):
         return
 
-    recipes = await get_all_recipes()
+    recipes = (await get_catalog()).recipes
     if not recipes:
         await message.answer("Нет доступных рецептов.")
         return
@@ -171,33 +219,118 @@ async def cmd_list_recipes(message: types.Message):
 ###
 
 
+async def recipe_page_keyboard(
+    action: str,
+    anchor: int = 0,
+    backward: bool = False,
+    title_prefix: str = "",
+) -> Optional[InlineKeyboardMarkup]:
+    """One page of recipe buttons with prev/next arrows, or None if empty"""
+    # One extra row tells whether there is anything beyond this page
+    rows = await get_recipe_titles(anchor, RECIPES_PER_PAGE + 1, title_prefix, backward)
+    more = len(rows) > RECIPES_PER_PAGE
+    if backward:
+        rows = rows[-RECIPES_PER_PAGE:]
+        has_prev, has_next = more, True
+    else:
+        rows = rows[:RECIPES_PER_PAGE]
+        has_prev, has_next = anchor > 0, more
+    if not rows:
+        return None
+
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                text=title,
+                callback_data=RecipePickCallback(
+                    action=action, recipe_id=recipe_id
+                ).pack(),
+            )
+        ]
+        for recipe_id, title in rows
+    ]
+    nav = []
+    if has_prev:
+        nav.append(
+            InlineKeyboardButton(
+                text="◀️",
+                callback_data=RecipePageCallback(
+                    action=action, anchor=rows[0][0], backward=True
+                ).pack(),
+            )
+        )
+    if has_next:
+        nav.append(
+            InlineKeyboardButton(
+                text="▶️",
+                callback_data=RecipePageCallback(
+                    action=action, anchor=rows[-1][0]
+                ).pack(),
+            )
+        )
+    if nav:
+        keyboard.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@admin_router.callback_query(RecipePageCallback.filter())
+async def process_recipe_page(
+    callback: types.CallbackQuery,
+    callback_data: RecipePageCallback,
+    state: FSMContext,
+):
+    """Flip a delete/edit recipe list to the previous or next page"""
+    if not is_admin(callback):
+        await callback.answer()
+        return
+
+    data = await state.get_data()
+    keyboard = await recipe_page_keyboard(
+        callback_data.action,
+        callback_data.anchor,
+        callback_data.backward,
+        data.get("title_prefix", ""),
+    )
+    if keyboard is not None:
+        await callback.message.edit_reply_markup(reply_markup=keyboard)
+    await callback.answer()
+
+
 @admin_router.message(Command("delete_recipe"))
-async def cmd_delete_recipe(message: types.Message, state: FSMContext):
-    """Start recipe deletion process"""
+async def cmd_delete_recipe(
+    message: types.Message,
+    state: FSMContext,
+    command: CommandObject,
+):
+    """Start recipe deletion process; `/delete_recipe Шок` filters by title"""
     if not is_admin(message):
         return
 
-    recipes = await get_all_recipes()
-    if not recipes:
+    title_prefix = (command.args or "").strip()
+    keyboard = await recipe_page_keyboard("delete", title_prefix=title_prefix)
+    if keyboard is None:
         await message.answer("Нет доступных рецептов для удаления.")
         return
 
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=f"{r.title}", callback_data=f"delete_{r.id}")]
-            for r in recipes
-        ]
-    )
-
     await message.answer("Выберите рецепт для удаления:", reply_markup=keyboard)
     await state.set_state(RecipeStates.confirm_delete)
+    await state.update_data(title_prefix=title_prefix)
 
 
-@admin_router.callback_query(RecipeStates.confirm_delete)
-async def process_delete_recipe(callback: types.CallbackQuery, state: FSMContext):
+@admin_router.callback_query(
+    RecipeStates.confirm_delete,
+    RecipePickCallback.filter(F.action == "delete"),
+    flags={"unit_of_work": True},
+)
+async def process_delete_recipe(
+    callback: types.CallbackQuery,
+    callback_data: RecipePickCallback,
+    state: FSMContext,
+    uow: UnitOfWork,
+):
     """Process recipe deletion"""
-    recipe_id = int(callback.data.split("_")[1])
-    success = await delete_recipe(recipe_id)
+    async with uow.transaction() as session:
+        success = await delete_recipe(callback_data.recipe_id, session=session)
 
     if success:
         await callback.message.answer("✅ Рецепт успешно удален!")
@@ -207,25 +340,81 @@ async def process_delete_recipe(callback: types.CallbackQuery, state: FSMContext
     await state.clear()
 
 
-####
+# Импорт и экспорт
+@admin_router.message(Command("import_recipes"))
+async def cmd_import_recipes(message: types.Message, state: FSMContext):
+    """Ask for a recipe file to import"""
+    if not is_admin(message):
+        return
+
+    await message.answer(
+        "Отправьте файл .jsonl или .csv с полями title, text, image, video "
+        "(image и video - file_id из Telegram)."
+    )
+    await state.set_state(RecipeStates.waiting_for_import)
 
 
-@admin_router.message(Command("broadcast"))
-async def cmd_broadcast(message: types.Message):
+@admin_router.message(RecipeStates.waiting_for_import, flags={"unit_of_work": True})
+async def process_import(message: types.Message, state: FSMContext, uow: UnitOfWork):
+    """Validate the uploaded file, then insert every recipe or none"""
+    if not message.document:
+        await message.answer("Пожалуйста, отправьте файл.")
+        return
+
+    suffix = Path(message.document.file_name or "").suffix.lower()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"import{suffix}"
+        await message.bot.download(message.document, destination=path)
+
+        errors = recipe_io.find_errors(path)
+        if errors:
+            report = "\n".join(f"Строка {line}: {error}" for line, error in errors)
+            await message.answer(f"❌ Файл не импортирован:\n\n{report}")
+            await state.clear()
+            return
+
+        async with uow.transaction() as session:
+            count = await import_recipes(
+                (recipe for _, recipe, _ in recipe_io.iter_records(path)),
+                session=session,
+            )
+
+    await message.answer(f"✅ Импортировано рецептов: {count}")
+    await state.clear()
+
+
+@admin_router.message(Command("export_recipes"))
+async def cmd_export_recipes(message: types.Message, command: CommandObject):
+    """Send all recipes as a JSONL (default) or CSV file"""
     if not is_admin(message):
         return
 
-    text = message.text.replace("/broadcast ", "", 1)
-    users = await get_all_users()
+    fmt = "csv" if (command.args or "").strip().lower() == "csv" else "jsonl"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"recipes.{fmt}"
+        with path.open("w", encoding="utf-8", newline="") as file:
+            writer = recipe_io.RecordWriter(file, fmt)
+            async for rows in iter_recipe_rows():
+                writer.write(rows)
+
+        await message.answer_document(
+            FSInputFile(path), caption=f"📦 Рецептов: {writer.count}"
+        )
+
+
+####
+
 
-    for user_id in users:
-        try:
-            await message.bot.send_message(user_id, text)
-            await asyncio.sleep(0.1)
-        except Exception as e:
-            logging.error(f"Failed to send message to {user_id}: {e}")
+@admin_router.message(Command("broadcast"))
+async def cmd_broadcast(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        return
 
-    await message.answer("Рассылка завершена!")
+    text = (command.args or "").strip()
+    if not text:
+        await message.answer("Использование: /broadcast текст рассылки")
+        return
+    await start_broadcast(message.bot, text, message.chat.id)
 
 
 @admin_router.message(Command("stats"))
@@ -233,43 +422,120 @@ async def cmd_stats(message: types.Message):
     if not is_admin(message):
         return
 
-    users = await get_all_users()
-    recipes = await get_all_recipes()
+    counters = await get_counters()
+    today = datetime.utcnow().date()
+    joins = await get_daily_joins(since=today - timedelta(days=27))
+
+    daily = "\n".join(
+        f"  {day:%d.%m}: +{joins.get(day, 0)}"
+        for day in (today - timedelta(days=i) for i in range(7))
+    )
+    weekly = "\n".join(
+        f"  {start:%d.%m}–{start + timedelta(days=6):%d.%m}: +"
+        f"{sum(joins.get(start + timedelta(days=d), 0) for d in range(7))}"
+        for start in (today - timedelta(days=6 + 7 * i) for i in range(4))
+    )
+
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    catalog = await get_catalog()
+    top = "\n".join(
+        f"  {getattr(catalog.by_id.get(recipe_id), 'title', recipe_id)}: {shown}"
+        for recipe_id, shown in await get_top_recipes(since=week_ago)
+    )
+    active_day = await count_active_users(since=now - timedelta(days=1))
+    active_week = await count_active_users(since=week_ago)
 
     stats = f"""📊 Статистика бота:
 
-👥 Всего пользователей: {len(users)}
-📝 Всего рецептов: {len(recipes)}"""
+👥 Всего пользователей: {counters.get("users", 0)}
+📝 Всего рецептов: {counters.get("recipes", 0)}
+
+📈 Новые пользователи по дням:
+{daily}
+
+📅 По неделям:
+{weekly}
+
+🟢 Активные пользователи: {active_day} за сутки, {active_week} за неделю
+
+🔥 Популярные рецепты за неделю:
+{top or "  пока нет данных"}"""
 
     await message.answer(stats)
 
 
+@admin_router.message(Command("metrics"))
+async def cmd_metrics(message: types.Message):
+    if not is_admin(message):
+        return
+
+    await message.answer(metrics.summary())
+
+
+@admin_router.message(Command("profile"))
+async def cmd_profile(message: types.Message, command: CommandObject):
+    """`/profile 60` samples a minute, `/profile 500 updates` the next 500 updates"""
+    if not is_admin(message):
+        return
+
+    args = (command.args or "30").split()
+    try:
+        amount = int(args[0])
+    except ValueError:
+        amount = 0
+    by_updates = len(args) > 1 and args[1].lower().startswith(("u", "о"))
+    if amount <= 0 or (len(args) > 1 and not by_updates):
+        await message.answer(
+            "Использование: /profile 60 (секунд) или /profile 500 updates"
+        )
+        return
+    if profiler.active:
+        await message.answer("Профилирование уже идёт.")
+        return
+
+    if by_updates:
+        start_profile(
+            message.bot, message.chat.id, settings.PROFILE_MAX_SECONDS, updates=amount
+        )
+        await message.answer(f"Профилирую следующие {amount} обновлений...")
+    else:
+        seconds = min(amount, settings.PROFILE_MAX_SECONDS)
+        start_profile(message.bot, message.chat.id, seconds)
+        await message.answer(f"Профилирую {seconds:g} секунд...")
+
+
 @admin_router.message(Command("edit_recipe"))
-async def cmd_edit_recipe(message: types.Message, state: FSMContext):
-    """Start recipe editing process"""
+async def cmd_edit_recipe(
+    message: types.Message,
+    state: FSMContext,
+    command: CommandObject,
+):
+    """Start recipe editing process; `/edit_recipe Шок` filters by title"""
     if not is_admin(message):
         return
 
-    recipes = await get_all_recipes()
-    if not recipes:
+    title_prefix = (command.args or "").strip()
+    keyboard = await recipe_page_keyboard("edit", title_prefix=title_prefix)
+    if keyboard is None:
         await message.answer("Нет доступных рецептов для редактирования.")
         return
 
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=f"{r.title}", callback_data=f"edit_{r.id}")]
-            for r in recipes
-        ]
-    )
-
     await message.answer("Выберите рецепт для редактирования:", reply_markup=keyboard)
     await state.set_state(RecipeStates.select_recipe)
+    await state.update_data(title_prefix=title_prefix)
 
 
-@admin_router.callback_query(RecipeStates.select_recipe)
-async def process_recipe_selection(callback: types.CallbackQuery, state: FSMContext):
+@admin_router.callback_query(
+    RecipeStates.select_recipe, RecipePickCallback.filter(F.action == "edit")
+)
+async def process_recipe_selection(
+    callback: types.CallbackQuery,
+    callback_data: RecipePickCallback,
+    state: FSMContext,
+):
     """Process recipe selection for editing"""
-    recipe_id = int(callback.data.split("_")[1])
+    recipe_id = callback_data.recipe_id
     recipe = await get_recipe(recipe_id)
 
     if not recipe:
@@ -281,10 +547,17 @@ async def process_recipe_selection(callback: types.CallbackQuery, state: FSMCont
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Название", callback_data="edit_title")],
-            [InlineKeyboardButton(text="Описание", callback_data="edit_text")],
-            [InlineKeyboardButton(text="Фото", callback_data="edit_image")],
-            [InlineKeyboardButton(text="Видео", callback_data="edit_video")],
+            [
+                InlineKeyboardButton(
+                    text=text, callback_data=RecipeFieldCallback(field=field).pack()
+                )
+            ]
+            for field, text in (
+                ("title", "Название"),
+                ("text", "Описание"),
+                ("image", "Фото"),
+                ("video", "Видео"),
+            )
         ]
     )
 
@@ -298,10 +571,14 @@ async def process_recipe_selection(callback: types.CallbackQuery, state: FSMCont
     await state.set_state(RecipeStates.select_field)
 
 
-@admin_router.callback_query(RecipeStates.select_field)
-async def process_field_selection(callback: types.CallbackQuery, state: FSMContext):
+@admin_router.callback_query(RecipeStates.select_field, RecipeFieldCallback.filter())
+async def process_field_selection(
+    callback: types.CallbackQuery,
+    callback_data: RecipeFieldCallback,
+    state: FSMContext,
+):
     """Process field selection for editing"""
-    field = callback.data.split("_")[1]
+    field = callback_data.field
     await state.update_data(edit_field=field)
 
     messages = {
@@ -315,45 +592,34 @@ async def process_field_selection(callback: types.CallbackQuery, state: FSMConte
     await state.set_state(RecipeStates.edit_field)
 
 
-@admin_router.message(RecipeStates.edit_field)
-async def process_field_update(message: types.Message, state: FSMContext):
+@admin_router.message(RecipeStates.edit_field, flags={"unit_of_work": True})
+async def process_field_update(
+    message: types.Message, state: FSMContext, uow: UnitOfWork
+):
     """Process field update"""
     data = await state.get_data()
     recipe_id = data["recipe_id"]
     field = data["edit_field"]
 
-    recipe = await get_recipe(recipe_id)
-    if not recipe:
-        await message.answer("Рецепт не найден.")
-        await state.clear()
-        return
-
-    # Prepare updated data
-    update_data = {
-        "title": recipe.title,
-        "text": recipe.text,
-        "image": recipe.image,
-        "video": recipe.video,
-    }
-
-    # Update specific field
-    if field == "title":
-        update_data["title"] = message.text
-    elif field == "text":
-        update_data["text"] = message.text
+    # Extract the new value for the edited field
+    if field in ("title", "text"):
+        value = message.text
     elif field == "image":
         if not message.photo:
             await message.answer("Пожалуйста, отправьте фото.")
             return
-        update_data["image"] = message.photo[-1].file_id
+        value = message.photo[-1].file_id
     elif field == "video":
         if not message.video:
             await message.answer("Пожалуйста, отправьте видео.")
             return
-        update_data["video"] = message.video.file_id
+        value = message.video.file_id
 
-    # Update recipe
-    updated_recipe = await update_recipe(recipe_id=recipe_id, **update_data)
+    # Update only that column
+    async with uow.transaction() as session:
+        updated_recipe = await update_recipe_field(
+            recipe_id, field, value, session=session
+        )
 
     if updated_recipe:
         await message.answer(
@@ -362,7 +628,7 @@ async def process_field_update(message: types.Message, state: FSMContext):
             f"📋 Описание: {updated_recipe.text}"
         )
     else:
-        await message.answer("❌ Ошибка при обновлении рецепта.")
+        await message.answer("Рецепт не найден.")
 
     await state.clear()
 
@@ -1,19 +1,44 @@
-import asyncio
 import logging
-import random
+from contextlib import suppress
+from typing import Sequence
 
 from aiogram import Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, CommandStart, CommandObject
-from aiogram.types import InputMediaPhoto, InputMediaVideo
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    InputMediaVideo,
+)
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.utils.payload import decode_payload
 
+from ..cache import CachedRecipe, RecipeCatalog, recipe_decks
 from ..config import settings
-from ..database import get_all_recipes, get_one_user, add_user
+from ..database import get_catalog, is_member, add_user, search_recipes
+from ..delivery import plans
+from ..events import Tracked
+from ..inline import inline_results
+from ..middlewares import EventLogMiddleware, ThrottlingMiddleware
+from ..onboarding import OnboardingScheduler, Step
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 user_router = Router()
+throttling = ThrottlingMiddleware()
+for observer in (
+    user_router.message,
+    user_router.callback_query,
+    user_router.inline_query,
+):
+    observer.middleware(EventLogMiddleware())
+    observer.middleware(throttling)
+
+RECIPES_PER_PAGE = 8
+SEARCH_RESULTS = 10
 
 MESSAGE_COMMAND = (
     # "👋 Добро пожаловать в кулинарный бот!\n"
@@ -25,6 +50,7 @@ MESSAGE_COMMAND = (
     "Що можно зробити:\n"
     "/recipe - Отримати випадковий рецепт\n"
     "/all_recipes - Отримати всі рецепти\n"
+    "/search - Знайти рецепт за словами\n"
 )
 
 MESSAGE_WELCOME_BIG = (
@@ -41,6 +67,20 @@ MESSAGE_WELCOME_BIG = (
 )
 
 
+def build_welcome_steps(video_notes: list[str]) -> list[Step]:
+    """Welcome text, the course video notes, then the command list
+
+    No delays between steps: the outbound scheduler paces the chat.
+    """
+    steps = [Step("message", MESSAGE_WELCOME_BIG)]
+    steps.extend(Step("video_note", note) for note in video_notes)
+    steps.append(Step("message", MESSAGE_COMMAND))
+    return steps
+
+
+onboarding = OnboardingScheduler(build_welcome_steps(settings.WELCOME_VIDEO_NOTES))
+
+
 # @user_router.message()
 # async def get_file_id(message: types.Message):
 #     if message.document:
@@ -64,105 +104,233 @@ async def cmd_start_with_deep_link(message: types.Message, command: CommandObjec
         return
 
     await add_user(user_id)
-
-    await message.answer(MESSAGE_WELCOME_BIG)
-    await asyncio.sleep(0.5)
-    for note in settings.WELCOME_VIDEO_NOTES:
-        await message.answer_video_note(note, protect_content=True)
-        await asyncio.sleep(2)
-    await message.answer(
-        MESSAGE_COMMAND,
-    )
+    onboarding.begin(message.chat.id)
 
 
 @user_router.message(CommandStart())
 async def cmd_start(message: types.Message):
-    user_id = message.from_user.id
-
-    user = await get_one_user(user_id)
-    if not user:
+    if not await is_member(message.from_user.id):
         return
     await message.answer(MESSAGE_COMMAND)
 
 
+class RecipePage(CallbackData, prefix="rpage"):
+    anchor: int
+    backward: bool = False
+
+
+class RecipeView(CallbackData, prefix="rview"):
+    recipe_id: int
+    action: str  # "open", "photo", "video" or "text"
+
+
+def render_index(
+    catalog: RecipeCatalog, page: Sequence[CachedRecipe]
+) -> tuple[str, InlineKeyboardMarkup]:
+    """Title buttons for one page plus arrows to the neighbouring pages"""
+    builder = InlineKeyboardBuilder()
+    for recipe in page:
+        builder.button(
+            text=recipe.title,
+            callback_data=RecipeView(recipe_id=recipe.id, action="open"),
+        )
+    builder.adjust(1)
+
+    first, last = page[0].id, page[-1].id
+    nav = []
+    if catalog.before(first, 1):
+        nav.append(
+            InlineKeyboardButton(
+                text="◀️", callback_data=RecipePage(anchor=first, backward=True).pack()
+            )
+        )
+    if catalog.after(last, 1):
+        nav.append(
+            InlineKeyboardButton(
+                text="▶️", callback_data=RecipePage(anchor=last).pack()
+            )
+        )
+    if nav:
+        builder.row(*nav)
+
+    start = catalog.position(first) + 1
+    text = f"📚 Рецепти {start}–{start + len(page) - 1} з {len(catalog)}:"
+    return text, builder.as_markup()
+
+
+def render_recipe(
+    catalog: RecipeCatalog, recipe: CachedRecipe, video: bool = False
+) -> tuple[InputMediaPhoto | InputMediaVideo, InlineKeyboardMarkup]:
+    """The recipe as one editable media message with navigation buttons"""
+    plan = plans.get(recipe)
+    media = plan.video if video and plan.video else plan.photo
+
+    nav = [
+        InlineKeyboardButton(
+            text=text,
+            callback_data=RecipeView(recipe_id=neighbour[0].id, action="photo").pack(),
+        )
+        for neighbour, text in (
+            (catalog.before(recipe.id, 1), "◀️"),
+            (catalog.after(recipe.id, 1), "▶️"),
+        )
+        if neighbour
+    ]
+    rows = [nav] if nav else []
+    if recipe.video:
+        switch = "photo" if video else "video"
+        rows.append(
+            [
+                InlineKeyboardButton(
+                    text="🖼 Фото" if video else "🎬 Відео",
+                    callback_data=RecipeView(recipe_id=recipe.id, action=switch).pack(),
+                )
+            ]
+        )
+    if plan.truncated:
+        rows.append(
+            [
+                InlineKeyboardButton(
+                    text="📖 Повний текст",
+                    callback_data=RecipeView(recipe_id=recipe.id, action="text").pack(),
+                )
+            ]
+        )
+    return media, InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 @user_router.message(Command("all_recipes"))
 async def cmd_all_recipes(message: types.Message):
-    user_id = message.from_user.id
-    user = await get_one_user(user_id)
-    if not user:
+    if not await is_member(message.from_user.id):
         return
 
-    recipes = await get_all_recipes()
-    if not recipes:
+    catalog = await get_catalog()
+    if not catalog:
         await message.answer("Пока нет доступных рецептов.")
         return
 
-    for recipe in recipes:
-        caption = f"{recipe.title}\n\n{recipe.text}"
-        if recipe.video:
-            media = [
-                InputMediaPhoto(
-                    media=recipe.image,
-                    caption=caption if len(caption) <= 1024 else recipe.title,
-                    caption_entities=message.entities,
-                    # show_caption_above_media=True,
-                ),
-                InputMediaVideo(
-                    media=recipe.video,
-                    caption=recipe.title if len(caption) >= 1024 else None,
-                ),
-            ]
-            await message.answer_media_group(
-                media,
-                protect_content=True,
-            )
+    text, markup = render_index(catalog, catalog.after(0, RECIPES_PER_PAGE))
+    await message.answer(text, reply_markup=markup)
 
-        else:
-            await message.answer_photo(
-                photo=recipe.image,
-                caption=caption if len(caption) <= 1024 else recipe.title,
-                caption_entities=message.entities,
-                protect_content=True,
-            )
-        if len(caption) > 1024:
-            await message.answer(caption, protect_content=True)
-        await asyncio.sleep(0.5)  # Prevent flood limits
+
+@user_router.callback_query(RecipePage.filter())
+async def show_recipe_page(callback: types.CallbackQuery, callback_data: RecipePage):
+    """Edit the index message in place to show the requested page"""
+    if not await is_member(callback.from_user.id):
+        await callback.answer()
+        return
+
+    catalog = await get_catalog()
+    if callback_data.backward:
+        page = catalog.before(callback_data.anchor, RECIPES_PER_PAGE)
+    else:
+        page = catalog.after(callback_data.anchor, RECIPES_PER_PAGE)
+    page = page or catalog.after(0, RECIPES_PER_PAGE)  # catalog shrank meanwhile
+    if not page:
+        await callback.message.edit_text("Пока нет доступных рецептов.")
+    else:
+        text, markup = render_index(catalog, page)
+        with suppress(TelegramBadRequest):  # "message is not modified"
+            await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
+@user_router.callback_query(RecipeView.filter())
+async def show_recipe(
+    callback: types.CallbackQuery, callback_data: RecipeView, tracked: Tracked
+):
+    """Open a recipe from the index, or switch the open one in place"""
+    tracked.recipe_id = callback_data.recipe_id
+    if not await is_member(callback.from_user.id):
+        tracked.outcome = "denied"
+        await callback.answer()
+        return
+
+    catalog = await get_catalog()
+    recipe = catalog.by_id.get(callback_data.recipe_id)
+    if recipe is None:
+        tracked.outcome = "missing"
+        await callback.answer("Рецепт більше недоступний.", show_alert=True)
+        return
+
+    action = callback_data.action
+    if action == "text":
+        await callback.message.answer(plans.get(recipe).full_text, protect_content=True)
+    elif action == "open":
+        media, markup = render_recipe(catalog, recipe)
+        await callback.message.answer_photo(
+            photo=media.media,
+            caption=media.caption,
+            reply_markup=markup,
+            protect_content=True,
+        )
+    else:
+        media, markup = render_recipe(catalog, recipe, video=action == "video")
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_media(media, reply_markup=markup)
+    await callback.answer()
+
+
+@user_router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    """Ranked full-text search over recipe titles and texts"""
+    if not await is_member(message.from_user.id):
+        return
+    if not command.args:
+        await message.answer("Напишіть, що шукати: /search шоколадний кекс")
+        return
+
+    catalog = await get_catalog()
+    found = [
+        catalog.by_id[recipe_id]
+        for recipe_id in await search_recipes(command.args, SEARCH_RESULTS)
+        if recipe_id in catalog.by_id
+    ]
+    if not found:
+        await message.answer("Нічого не знайдено.")
+        return
+
+    builder = InlineKeyboardBuilder()
+    for recipe in found:
+        builder.button(
+            text=recipe.title,
+            callback_data=RecipeView(recipe_id=recipe.id, action="open"),
+        )
+    builder.adjust(1)
+    await message.answer(
+        f"🔎 Знайдено рецептів: {len(found)}", reply_markup=builder.as_markup()
+    )
+
+
+@user_router.inline_query()
+async def inline_search(query: types.InlineQuery):
+    """`@bot cupcake` in any chat: matching recipes as cached photos"""
+    # Answers differ between members and everyone else, so never share them
+    if not await is_member(query.from_user.id):
+        await query.answer([], cache_time=settings.INLINE_CACHE_TIME, is_personal=True)
+        return
+    results = await inline_results.get(query.query)
+    await query.answer(
+        list(results), cache_time=settings.INLINE_CACHE_TIME, is_personal=True
+    )
 
 
 @user_router.message(Command("recipe"))
-async def cmd_random_recipe(message: types.Message):
-    user_id = message.from_user.id
-    user = await get_one_user(user_id)
-    if not user:
+async def cmd_random_recipe(message: types.Message, tracked: Tracked):
+    if not await is_member(message.from_user.id):
+        tracked.outcome = "denied"
         return
 
     """Send a random recipe to the user"""
-    recipes = await get_all_recipes()
-    if not recipes:
+    catalog = await get_catalog()
+    if settings.RANDOM_RECIPE_NO_REPEAT:
+        recipe = recipe_decks.draw(message.from_user.id, catalog)
+    else:
+        recipe = catalog.random()
+    if recipe is None:
+        tracked.outcome = "empty"
         await message.answer("Пока нет доступных рецептов.")
         return
 
-    recipe = random.choice(recipes)
-    caption = f"{recipe.title}\n\n{recipe.text}"
-    if recipe.video:
-        media = [
-            InputMediaPhoto(
-                media=recipe.image,
-                caption=caption if len(caption) <= 1024 else recipe.title,
-            ),
-            InputMediaVideo(
-                media=recipe.video,
-                caption=recipe.title if len(caption) >= 1024 else None,
-            ),
-        ]
-
-        await message.answer_media_group(media, protect_content=True)
-
-    else:
-        await message.answer_photo(
-            photo=recipe.image,
-            caption=caption if len(caption) <= 1024 else recipe.title,
-            protect_content=True,
-        )
-    if len(caption) > 1024:
-        await message.answer(caption, protect_content=True)
+    tracked.recipe_id = recipe.id
+    await plans.get(recipe).send(message.bot, message.chat.id)
@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import metrics
+from .config import settings
+
+# Tokens per command, roughly the Bot API calls it triggers; anything not
+# listed (/start, opening a recipe) costs 1. Inline queries arrive on every
+# keystroke and are answered from memory, and pager clicks only edit a
+# message, so both are free.
+COMMAND_COSTS = {
+    "recipe": 3,
+    "all_recipes": 2,
+    "search": 2,
+    "inline": 0,
+    "rpage": 0,
+}
+
+
+class UserThrottle:
+    """Per-user token buckets for incoming commands
+
+    Each user costs one (tokens, updated_at, refused) tuple in an ordered
+    dict kept in last-use order. A bucket idle for `ttl` seconds has long
+    refilled, so the oldest entries are dropped as newer ones arrive and
+    memory follows the number of recently active users.
+    """
+
+    def __init__(self, rate: float, burst: float, ttl: float = 600.0):
+        self.rate = rate
+        self.burst = burst
+        # Never forget a bucket before it could have refilled
+        self.ttl = max(ttl, burst / rate) if rate else ttl
+        self._buckets: OrderedDict[int, tuple[float, float, bool]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(
+        self, user_id: int, cost: float, now: Optional[float] = None
+    ) -> tuple[float, bool]:
+        """Charge `cost` tokens, or return (seconds to wait, first refusal?)
+
+        The second value is True only for the first refusal of a streak, so
+        the caller can explain the limit once instead of on every update.
+        """
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        tokens, updated, refused = self._buckets.pop(user_id, (self.burst, now, False))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        missing = min(cost, self.burst) - tokens
+        if missing > 0:
+            self._buckets[user_id] = (tokens, now, True)
+            return missing / self.rate, not refused
+        self._buckets[user_id] = (tokens - cost, now, False)
+        return 0.0, False
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            user_id, (_, updated, _) = next(iter(self._buckets.items()))
+            if now - updated < self.ttl:
+                break
+            del self._buckets[user_id]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+throttle = UserThrottle(
+    settings.THROTTLE_RATE, settings.THROTTLE_BURST, settings.THROTTLE_TTL
+)
+
+metrics.registry.gauge(
+    "bot_throttle_users",
+    "Users with a live throttling bucket",
+    lambda: len(throttle),
+)
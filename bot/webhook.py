@@ -0,0 +1,121 @@
+import asyncio
+import hmac
+import logging
+import secrets
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from aiohttp import web
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Accepts webhook updates and hands them to a fixed pool of workers
+
+    The HTTP handler only validates the request and enqueues the update, so
+    Telegram gets its 200 right away. When the queue is full the update is
+    refused with 503 and Telegram redelivers it later, which keeps memory
+    bounded during launch-day spikes. A secret is mandatory: without it
+    anyone reaching the URL could post updates as an admin.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret: str = settings.WEBHOOK_SECRET,
+        workers: int = settings.WEBHOOK_WORKERS,
+        queue_size: int = settings.WEBHOOK_QUEUE_SIZE,
+    ):
+        if not secret:
+            raise ValueError("Webhook mode requires a secret token")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(
+                await request.json(), context={"bot": self.bot}
+            )
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning("Update queue is full, asking Telegram to retry")
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                result = await self.dispatcher.feed_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(self.bot, result)
+            except Exception:
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                self.queue.task_done()
+
+    def start_workers(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop_workers(self, drain_timeout: float = 10.0) -> None:
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %s unprocessed updates", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def app(self, path: str = settings.WEBHOOK_PATH) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    """Register the webhook with Telegram and serve updates until cancelled"""
+    secret = settings.WEBHOOK_SECRET
+    if not secret:
+        # Telegram gets the secret on every start, so a fresh one per run works
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET is not set, using a random one for this run")
+    server = WebhookServer(dispatcher, bot, secret=secret)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+
+    server.start_workers()
+    await site.start()
+    await bot.set_webhook(
+        f"{settings.WEBHOOK_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+        secret_token=secret,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+    logger.info(
+        "Webhook server listening on %s:%s",
+        settings.WEBHOOK_HOST,
+        settings.WEBHOOK_PORT,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await server.stop_workers()
+        await bot.session.close()
@@ -2,8 +2,13 @@ import asyncio
 from pathlib import Path
 
 import pytest
+from sqlalchemy import MetaData
 
 from bot import init_db
+from bot.cache import member_cache, recipe_cache
+from bot.database import DB_PATH, IS_SQLITE, dispose_engines, engine
+from bot.delivery import plans
+from bot.throttling import throttle
 
 
 @pytest.fixture(scope="session")
@@ -14,14 +19,30 @@ def event_loop():
     loop.close()
 
 
+def _drop_everything(conn):
+    metadata = MetaData()
+    metadata.reflect(conn)
+    metadata.drop_all(conn)
+
+
 @pytest.fixture(autouse=True)
 async def setup_database():
-    """Setup test database before each test."""
-    Path("data").mkdir(exist_ok=True)
+    """Setup test database before each test.
+
+    Runs against DATABASE_URL, so the suite can be pointed at a local
+    PostgreSQL (see docker-compose.yml) as well as the default SQLite file.
+    """
     await init_db()
     yield
     # Cleanup after tests
-    try:
-        Path("data/recipes.db").unlink()
-    except FileNotFoundError:
-        pass
+    if not IS_SQLITE:
+        async with engine.begin() as conn:
+            await conn.run_sync(_drop_everything)
+    await dispose_engines()
+    recipe_cache.invalidate()
+    plans.clear()
+    throttle.clear()
+    member_cache.clear()
+    if IS_SQLITE:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+from aiohttp.test_utils import TestServer
+
+from benchmarks.api_server import FakeBotAPI, FloodControl
+from bot.outbound import OutboundScheduler
+
+
+@pytest.fixture
+async def stand_in():
+    """Returns a factory: FakeBotAPI instance -> Bot talking to it over HTTP"""
+    servers, bots = [], []
+
+    async def start(api: FakeBotAPI) -> Bot:
+        server = TestServer(api.app())
+        await server.start_server()
+        servers.append(server)
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(str(server.make_url("")))
+        )
+        bot = Bot("42:TEST", session=session)
+        bots.append(bot)
+        return bot
+
+    yield start
+    for bot in bots:
+        await bot.session.close()
+    for server in servers:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_stand_in_answers_the_methods_the_bot_uses(stand_in):
+    api = FakeBotAPI()
+    bot = await stand_in(api)
+
+    message = await bot.send_message(1, "Привіт")
+    photo = await bot.send_photo(1, "photo-1", caption="Торт")
+    note = await bot.send_video_note(1, "note-1")
+    album = await bot.send_media_group(
+        1, [InputMediaPhoto(media="a"), InputMediaPhoto(media="b")]
+    )
+
+    assert message.text == "Привіт" and message.chat.id == 1
+    assert photo.photo[0].file_id == "photo-1" and photo.caption == "Торт"
+    assert note.video_note.file_id == "note-1"
+    assert [m.photo[0].file_id for m in album] == ["a", "b"]
+    assert await bot.set_webhook("https://example.com/webhook")
+    assert api.webhook_url == "https://example.com/webhook"
+    assert (await bot.get_me()).id == 42
+
+
+@pytest.mark.asyncio
+async def test_stand_in_serves_injected_updates(stand_in):
+    api = FakeBotAPI()
+    bot = await stand_in(api)
+    api.feed(
+        {
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 7, "type": "private"},
+                "text": "/recipe",
+            }
+        }
+    )
+
+    first = await bot.get_updates(timeout=0)
+    confirmed = await bot.get_updates(offset=first[-1].update_id + 1, timeout=0)
+
+    assert [u.message.text for u in first] == ["/recipe"]
+    assert confirmed == []
+
+
+@pytest.mark.asyncio
+async def test_stand_in_refuses_floods_with_retry_after(stand_in):
+    api = FakeBotAPI(flood=FloodControl(global_rate=100, chat_rate=0.5, chat_burst=2))
+    bot = await stand_in(api)
+
+    await bot.send_message(1, "one")
+    await bot.send_message(1, "two")
+    with pytest.raises(TelegramRetryAfter) as error:
+        await bot.send_message(1, "three")
+    # Another chat has its own allowance; an album costs one send per item
+    await bot.send_media_group(2, [InputMediaPhoto(media=str(i)) for i in range(3)])
+    with pytest.raises(TelegramRetryAfter):
+        await bot.send_message(2, "after the album")
+
+    assert error.value.retry_after == 2
+    assert api.refused == {"sendMessage": 2}
+
+
+@pytest.mark.asyncio
+async def test_outbound_scheduler_stays_within_stand_in_limits(stand_in):
+    # One message of headroom for requests that overtake each other in flight
+    api = FakeBotAPI(flood=FloodControl(global_rate=50, chat_rate=20, chat_burst=2))
+    bot = await stand_in(api)
+    bot.session.middleware(
+        OutboundScheduler(global_rate=50, chat_rate=20, chat_burst=1)
+    )
+
+    await asyncio.gather(*(bot.send_message(1, str(i)) for i in range(6)))
+
+    assert api.calls["sendMessage"] == 6
+    assert not api.refused
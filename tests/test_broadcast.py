@@ -0,0 +1,82 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+from aiogram.methods import SendMessage
+
+from bot.broadcast import DeliveryStatus, TokenBucket, deliver, run_broadcast
+from bot.database import add_user, create_broadcast_job, get_unfinished_broadcast_jobs
+
+METHOD = SendMessage(chat_id=1, text="hi")
+
+
+@pytest.mark.asyncio
+async def test_broadcast_classifies_failures():
+    bot = AsyncMock()
+
+    async def send_message(user_id, text):
+        if user_id == 2:
+            raise TelegramForbiddenError(
+                METHOD, "Forbidden: bot was blocked by the user"
+            )
+        if user_id == 3:
+            raise TelegramForbiddenError(METHOD, "Forbidden: user is deactivated")
+
+    bot.send_message.side_effect = send_message
+    for user_id in (1, 2, 3, 4):
+        await add_user(user_id)
+    job = await create_broadcast_job("hi", chat_id=100, total=4)
+
+    stats = await run_broadcast(bot, job, rate=1000, concurrency=2)
+
+    assert stats.total == 4
+    assert stats.sent == 2
+    assert stats.blocked == 1
+    assert stats.deactivated == 1
+    assert stats.failed == 0
+    assert await get_unfinished_broadcast_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resumes_after_checkpoint():
+    bot = AsyncMock()
+    for user_id in range(1, 6):
+        await add_user(user_id)
+    job = await create_broadcast_job("hi", chat_id=100, total=5)
+    job.last_user_id = 3
+    job.sent = 3
+
+    stats = await run_broadcast(bot, job, rate=1000, batch_size=2)
+
+    sent_to = [call.args[0] for call in bot.send_message.await_args_list]
+    assert sent_to == [4, 5]
+    assert stats.sent == 5
+    assert job.last_user_id == 5
+
+
+@pytest.mark.asyncio
+async def test_deliver_honors_retry_after():
+    bot = AsyncMock()
+    bot.send_message.side_effect = [
+        TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=0),
+        None,
+    ]
+
+    status = await deliver(bot, TokenBucket(1000), 1, "hi")
+
+    assert status is DeliveryStatus.SENT
+    assert bot.send_message.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_deliver_gives_up_on_transient_errors():
+    bot = AsyncMock()
+    bot.send_message.side_effect = TelegramNetworkError(METHOD, "timeout")
+
+    status = await deliver(bot, TokenBucket(1000), 1, "hi", max_retries=0)
+
+    assert status is DeliveryStatus.FAILED
@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from bot.cache import (
+    CachedRecipe,
+    MemberCache,
+    RecipeCatalog,
+    RecipeDecks,
+    _permute,
+    member_cache,
+    recipe_cache,
+)
+from bot.database import (
+    add_recipe,
+    add_user,
+    delete_recipe,
+    get_catalog,
+    is_member,
+    load_members,
+    update_recipe,
+    verify_members,
+)
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_served_from_cache():
+    await add_recipe(title="Cupcake", text="Bake it", image="img")
+
+    first = await get_catalog()
+    second = await get_catalog()
+
+    assert first is second
+    assert [r.title for r in first] == ["Cupcake"]
+    assert recipe_cache.hits >= 1
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_invalidated_on_write():
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="img")
+    await get_catalog()
+
+    await update_recipe(recipe.id, title="Muffin", text="Bake it", image="img")
+    assert (await get_catalog()).by_id[recipe.id].title == "Muffin"
+
+    await delete_recipe(recipe.id)
+    assert not await get_catalog()
+
+
+@pytest.mark.asyncio
+async def test_stale_load_is_not_installed():
+    generation = recipe_cache.generation
+    recipe_cache.invalidate()
+
+    installed = recipe_cache.swap(await get_catalog(), generation)
+
+    assert installed is False
+
+
+@pytest.mark.parametrize("mode", ["set", "compact"])
+def test_member_cache_lookup(mode):
+    cache = MemberCache(mode)
+    cache.extend([1, 5, 9])
+    cache.add(3)
+
+    assert 3 in cache and 5 in cache
+    assert 4 not in cache
+    assert cache.checksum() == (4, 18)
+
+
+def test_member_cache_limit_marks_incomplete():
+    cache = MemberCache("compact", limit=2)
+    cache.complete = True
+
+    assert cache.extend([1, 2, 3]) is False
+    cache.add(4)
+
+    assert len(cache) == 2
+    assert cache.complete is False
+
+
+@pytest.mark.asyncio
+async def test_is_member_uses_cache():
+    await add_user(42)
+    await load_members()
+
+    assert await is_member(42)
+    assert not await is_member(43)
+
+
+@pytest.mark.asyncio
+async def test_verify_members_reloads_on_mismatch():
+    await load_members()
+    await add_user(7)
+    member_cache.replace(MemberCache())  # simulate a lost update
+    member_cache.complete = True
+
+    assert await verify_members() is False
+    assert 7 in member_cache
+
+
+def test_recipe_decks_cycle_without_repeats():
+    catalog = RecipeCatalog(
+        (CachedRecipe(i, f"r{i}", "", "") for i in range(1, 6)), generation=1
+    )
+    decks = RecipeDecks(max_users=10)
+
+    first_round = {decks.draw(1, catalog).id for _ in range(5)}
+    decks.draw(1, catalog)
+
+    assert first_round == {1, 2, 3, 4, 5}
+    assert len(decks) == 1
+
+
+def test_permutation_is_a_bijection():
+    for size in (1, 2, 3, 5, 16, 17, 1000):
+        for seed in (0, 1, 2**63 + 12345):
+            images = [_permute(i, size, seed) for i in range(size)]
+            assert sorted(images) == list(range(size))
+
+
+def test_recipe_decks_survive_edits_and_reshuffle_on_deletes():
+    def catalog(ids, generation):
+        return RecipeCatalog(
+            (CachedRecipe(i, f"r{i}", "", "") for i in ids), generation=generation
+        )
+
+    decks = RecipeDecks(max_users=10)
+    seen = [decks.draw(1, catalog(range(1, 11), 1)).id for _ in range(3)]
+    # Another generation with the same ids (an edit) keeps the deck
+    seen += [decks.draw(1, catalog(range(1, 11), 2)).id for _ in range(7)]
+
+    assert sorted(seen) == list(range(1, 11))
+
+    # A deleted recipe starts a fresh deck over what is left
+    shrunk = catalog(range(2, 11), 3)
+    assert {decks.draw(1, shrunk).id for _ in range(9)} == set(range(2, 11))
+
+
+def test_recipe_decks_ignore_id_gaps():
+    ids = [1, 2_000_000, 4_000_000_000]
+    sparse = RecipeCatalog(CachedRecipe(i, f"r{i}", "", "") for i in ids)
+    decks = RecipeDecks(max_users=10)
+
+    started = time.perf_counter()
+    drawn = [decks.draw(1, sparse).id for _ in range(300)]
+
+    assert time.perf_counter() - started < 0.5
+    assert all(sorted(drawn[i : i + 3]) == ids for i in range(0, 300, 3))
+
+
+def test_recipe_decks_are_bounded():
+    catalog = RecipeCatalog([CachedRecipe(1, "r", "", "")])
+    decks = RecipeDecks(max_users=2)
+
+    for user_id in range(5):
+        decks.draw(user_id, catalog)
+
+    assert len(decks) == 2
+
+
+def test_catalog_keyset_pages():
+    catalog = RecipeCatalog(CachedRecipe(i, f"r{i}", "", "") for i in (2, 4, 6, 8))
+
+    assert [r.id for r in catalog.after(0, 3)] == [2, 4, 6]
+    assert [r.id for r in catalog.after(6, 3)] == [8]
+    assert [r.id for r in catalog.before(8, 2)] == [4, 6]
+    # Anchors survive deletions: a missing id still splits the catalog
+    assert [r.id for r in catalog.after(5, 1)] == [6]
+    assert catalog.before(2, 1) == ()
@@ -1,11 +1,30 @@
+import asyncio
+from datetime import datetime, timedelta
+
 import pytest
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from bot.database import (
+    IS_SQLITE,
     Base,
+    engine as writer_engine,
+    RegistrationBatcher,
     add_recipe,
+    add_user,
+    count_active_users,
+    get_all_users,
+    get_counters,
+    get_daily_joins,
+    rebuild_stats,
+    search_recipes,
+    unit_of_work,
+    update_recipe_field,
+    write_session,
     get_recipe,
+    get_recipe_titles,
+    insert_events,
     update_recipe,
     delete_recipe,
 )
@@ -88,3 +107,187 @@ async def test_delete_recipe(session):
     # Verify deletion
     deleted = await get_recipe(recipe.id)
     assert deleted is None
+
+
+@pytest.mark.asyncio
+async def test_add_user_is_idempotent(session):
+    assert await add_user(1) is True
+    assert await add_user(1) is False
+    assert await get_all_users() == [1]
+
+
+@pytest.mark.asyncio
+async def test_registration_batcher_coalesces(session):
+    batcher = RegistrationBatcher(window=0.01)
+
+    results = await asyncio.gather(*(batcher.register(i) for i in (1, 2, 2, 3)))
+
+    assert results == [True, True, False, True]
+    assert sorted(await get_all_users()) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_writes(session):
+    await add_user(1)
+    await add_user(2)
+    await add_user(2)
+    recipe = await add_recipe(title="A", text="B", image="C")
+    await add_recipe(title="D", text="E", image="F")
+    await delete_recipe(recipe.id)
+
+    assert await get_counters() == {"users": 2, "recipes": 1}
+    today = datetime.utcnow().date()
+    assert await get_daily_joins(since=today) == {today: 2}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_stats(session):
+    await add_user(1)
+    await add_recipe(title="A", text="B", image="C")
+
+    async with write_session() as db:
+        await rebuild_stats(db)
+        await db.commit()
+
+    assert await get_counters() == {"users": 1, "recipes": 1}
+    today = datetime.utcnow().date()
+    assert await get_daily_joins(since=today) == {today: 1}
+
+
+@pytest.mark.skipif(not IS_SQLITE, reason="SQLite pragmas")
+@pytest.mark.asyncio
+async def test_storage_profile_is_applied(session):
+    async with writer_engine.connect() as conn:
+        mode = await conn.scalar(text("PRAGMA journal_mode"))
+        synchronous = await conn.scalar(text("PRAGMA synchronous"))
+
+    assert mode == "wal"
+    assert synchronous == 1  # NORMAL
+
+
+@pytest.mark.asyncio
+async def test_reads_do_not_wait_for_writer(session):
+    await add_user(1)
+
+    async with write_session():
+        users = await asyncio.wait_for(get_all_users(), timeout=1)
+
+    assert users == [1]
+
+
+@pytest.mark.asyncio
+async def test_update_recipe_field(session):
+    recipe = await add_recipe(title="Old", text="Text", image="image.jpg")
+
+    updated = await update_recipe_field(recipe.id, "title", "New")
+
+    assert updated.title == "New"
+    assert updated.text == "Text"
+    assert (await get_recipe(recipe.id)).title == "New"
+    assert await update_recipe_field(recipe.id + 1, "title", "X") is None
+    with pytest.raises(ValueError):
+        await update_recipe_field(recipe.id, "id", "1")
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_shares_one_session(session):
+    async with unit_of_work() as uow:
+        async with uow.transaction() as db:
+            recipe = await add_recipe(title="A", text="B", image="C", session=db)
+            # Helpers opening their own write session join the transaction
+            await add_user(1)
+            await update_recipe_field(recipe.id, "text", "D", session=db)
+
+    assert (await get_recipe(recipe.id)).text == "D"
+    assert await get_all_users() == [1]
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_holds_writer_lock_only_while_writing(session):
+    async with unit_of_work() as uow:
+        # An open unit of work (e.g. a handler awaiting Telegram) blocks nobody
+        assert await asyncio.wait_for(add_user(1), timeout=1)
+        async with uow.transaction() as db:
+            await add_recipe(title="A", text="B", image="C", session=db)
+        assert await asyncio.wait_for(add_user(2), timeout=1)
+
+    assert await get_all_users() == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_failed_transaction(session):
+    async with unit_of_work() as uow:
+        with pytest.raises(RuntimeError):
+            async with uow.transaction() as db:
+                await add_recipe(title="A", text="B", image="C", session=db)
+                # Joined helpers must not commit the unit halfway through
+                await add_user(1)
+                await insert_events([(datetime.utcnow(), 1, None, "start", 1, "ok")])
+                raise RuntimeError
+
+    assert (await get_counters())["recipes"] == 0
+    assert await get_recipe_titles() == []
+    assert await get_all_users() == []
+    assert await count_active_users(datetime.utcnow() - timedelta(days=1)) == 0
+
+
+@pytest.mark.asyncio
+async def test_search_recipes_ranks_prefix_matches():
+    cake = await add_recipe(title="Шоколадний кекс", text="Какао і масло", image="i")
+    muffin = await add_recipe(title="Мафін", text="Трохи шоколаду", image="i")
+    await add_recipe(title="Ванільний кекс", text="Ваніль", image="i")
+
+    assert await search_recipes("шоколад") == [cake.id, muffin.id]
+    assert await search_recipes("КЕКС шокол") == [cake.id]
+    assert await search_recipes("!!!") == []
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_writes():
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="i")
+
+    await update_recipe_field(recipe.id, "title", "Muffin")
+    assert await search_recipes("cupcake") == []
+    assert await search_recipes("muff") == [recipe.id]
+
+    await delete_recipe(recipe.id)
+    assert await search_recipes("muffin") == []
+
+
+@pytest.mark.asyncio
+async def test_recipe_titles_keyset_pages():
+    ids = [
+        (await add_recipe(title=title, text="t", image="i")).id
+        for title in ("Apple pie", "Banana bread", "apricot tart", "Cupcake")
+    ]
+
+    first = await get_recipe_titles(limit=2)
+    second = await get_recipe_titles(first[-1][0], limit=2)
+    back = await get_recipe_titles(second[0][0], limit=2, backward=True)
+
+    assert first == [(ids[0], "Apple pie"), (ids[1], "Banana bread")]
+    assert [recipe_id for recipe_id, _ in second] == ids[2:]
+    assert back == first
+    assert await get_recipe_titles(title_prefix="ap") == [
+        (ids[0], "Apple pie"),
+        (ids[2], "apricot tart"),
+    ]
+    assert await get_recipe_titles(title_prefix="%") == []
+
+
+@pytest.mark.asyncio
+async def test_recipe_title_prefix_folds_cyrillic_case():
+    ids = [
+        (await add_recipe(title=title, text="t", image="i")).id
+        for title in ("Шоколадний кекс", "Борщ", "шоколадне печиво", "ШОКО-торт")
+    ]
+
+    first = await get_recipe_titles(limit=2, title_prefix="шок")
+    rest = await get_recipe_titles(first[-1][0], limit=2, title_prefix="ШОК")
+    back = await get_recipe_titles(
+        rest[0][0], limit=2, title_prefix="Шок", backward=True
+    )
+
+    assert first == [(ids[0], "Шоколадний кекс"), (ids[2], "шоколадне печиво")]
+    assert rest == [(ids[3], "ШОКО-торт")]
+    assert back == first
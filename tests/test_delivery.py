@@ -0,0 +1,85 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.methods import SendMediaGroup, SendMessage, SendPhoto
+
+from bot import metrics
+from bot.cache import CachedRecipe
+from bot.database import (
+    add_recipe,
+    delete_recipe,
+    get_catalog,
+    update_recipe,
+    update_recipe_field,
+)
+from bot.delivery import PlanCache, compile_plan, plans
+
+
+def test_short_recipe_is_one_photo():
+    plan = compile_plan(CachedRecipe(1, "Cupcake", "Bake it", "img"))
+
+    assert [type(call) for call in plan.calls] == [SendPhoto]
+    assert plan.caption == "Cupcake\n\nBake it"
+    assert not plan.truncated
+    assert plan.video is None
+
+
+def test_long_recipe_with_video_sends_text_separately():
+    plan = compile_plan(CachedRecipe(1, "Cupcake", "x" * 2000, "img", "vid"))
+
+    assert [type(call) for call in plan.calls] == [SendMediaGroup, SendMessage]
+    assert plan.caption == "Cupcake"
+    assert plan.calls[1].text == plan.full_text
+    assert plan.video.media == "vid"
+
+
+@pytest.mark.asyncio
+async def test_send_replays_calls_for_chat():
+    bot = AsyncMock()
+    plan = compile_plan(CachedRecipe(1, "Cupcake", "x" * 2000, "img"))
+
+    await plan.send(bot, 42)
+
+    sent = [call.args[0] for call in bot.await_args_list]
+    assert [method.chat_id for method in sent] == [42, 42]
+    assert all(call.chat_id == 0 for call in plan.calls)
+
+
+@pytest.mark.asyncio
+async def test_plans_are_recompiled_after_edit():
+    cache = PlanCache()
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="img")
+    first = cache.get((await get_catalog()).by_id[recipe.id])
+    assert cache.get((await get_catalog()).by_id[recipe.id]) is first
+
+    await update_recipe(recipe.id, title="Muffin", text="Bake it", image="img")
+    await update_recipe_field(recipe.id, "text", "Bake it longer")
+    cached = (await get_catalog()).by_id[recipe.id]
+
+    assert cached.version == 3
+    assert cache.get(cached).caption == "Muffin\n\nBake it longer"
+    assert cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_deleted_recipe_plans_are_dropped():
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="img")
+    plans.get((await get_catalog()).by_id[recipe.id])
+
+    await delete_recipe(recipe.id)
+    reused = await add_recipe(title="Muffin", text="Bake it", image="img")
+
+    # On SQLite the new recipe reuses the deleted id, starting at version 1
+    assert plans.get((await get_catalog()).by_id[reused.id]).caption.startswith(
+        "Muffin"
+    )
+
+
+def test_plan_cache_totals_are_exported_as_counters():
+    plans.get(CachedRecipe(1, "Торт", "Текст", "photo"))
+
+    text = metrics.registry.render()
+
+    assert "# TYPE bot_plan_cache_misses_total counter" in text
+    assert f"bot_plan_cache_hits_total {plans.hits}" in text
+    assert f"bot_plan_cache_misses_total {plans.misses}" in text
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot import metrics
+from bot.database import count_active_users, get_top_recipes
+from bot.events import EventLog, event_log
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_instead_of_blocking():
+    log = EventLog(capacity=2, flush_interval=60, flush_size=100)
+
+    for user_id in range(5):
+        log.record(user_id, "recipe", recipe_id=1)
+
+    assert len(log) == 2
+    assert log.dropped == 3
+    assert await log.flush() == 2
+    assert log.written == 2 and len(log) == 0
+
+
+@pytest.mark.asyncio
+async def test_flusher_writes_when_batch_is_full():
+    log = EventLog(capacity=100, flush_interval=60, flush_size=3)
+    await log.start()
+    try:
+        for user_id in (1, 2, 2):
+            log.record(user_id, "rview", recipe_id=7)
+        await asyncio.sleep(0.1)
+        assert log.written == 3
+    finally:
+        await log.stop()
+
+
+@pytest.mark.asyncio
+async def test_stats_from_events():
+    log = EventLog()
+    for user_id, recipe_id, outcome in [
+        (1, 7, "ok"),
+        (2, 7, "ok"),
+        (2, 9, "ok"),
+        (3, 9, "denied"),
+        (4, None, "ok"),
+    ]:
+        log.record(user_id, "recipe", recipe_id, 1.5, outcome)
+    await log.flush()
+    since = datetime.utcnow() - timedelta(days=1)
+
+    assert await get_top_recipes(since) == [(7, 2), (9, 1)]
+    assert await count_active_users(since) == 4
+    assert await count_active_users(datetime.utcnow() + timedelta(days=1)) == 0
+
+
+def test_dropped_events_are_exported_as_a_counter():
+    text = metrics.registry.render()
+
+    assert "# TYPE bot_events_dropped_total counter" in text
+    assert f"bot_events_dropped_total {event_log.dropped}" in text
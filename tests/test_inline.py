@@ -0,0 +1,44 @@
+import pytest
+
+from bot import metrics
+from bot.database import add_recipe, update_recipe_field
+from bot.inline import InlineResultCache, inline_results
+
+
+@pytest.mark.asyncio
+async def test_inline_results_are_cached_per_query():
+    cake = await add_recipe(title="Шоколадний кекс", text="Какао", image="photo-1")
+    await add_recipe(title="Мафін", text="Ваніль", image="photo-2")
+    cache = InlineResultCache()
+
+    first = await cache.get("Шок")
+    second = await cache.get("  шок ")
+
+    assert first is second
+    assert [(r.id, r.photo_file_id) for r in first] == [(str(cake.id), "photo-1")]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(await cache.get("")) == 2
+
+
+@pytest.mark.asyncio
+async def test_inline_results_follow_catalog_changes():
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="photo")
+    cache = InlineResultCache(max_size=1)
+    assert len(await cache.get("cup")) == 1
+
+    await update_recipe_field(recipe.id, "title", "Muffin")
+
+    assert await cache.get("cup") == ()
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_inline_cache_totals_are_exported_as_counters():
+    await add_recipe(title="Торт", text="t", image="photo")
+    await inline_results.get("торт")
+
+    text = metrics.registry.render()
+
+    assert "# TYPE bot_inline_cache_hits_total counter" in text
+    assert f"bot_inline_cache_hits_total {inline_results.hits}" in text
+    assert f"bot_inline_cache_misses_total {inline_results.misses}" in text
@@ -0,0 +1,80 @@
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot import metrics
+from bot.cache import recipe_cache
+from bot.database import add_recipe, get_catalog
+from bot.metrics import ApiMetricsMiddleware, Histogram, Registry
+
+
+def test_histogram_quantiles_and_rendering():
+    registry = Registry()
+    histogram = registry.histogram(
+        "latency_seconds", "Test", ("command",), buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value, "recipe")
+
+    assert histogram.count("recipe") == 4
+    assert histogram.quantile(0.5, "recipe") == 0.1
+    assert histogram.quantile(0.99, "recipe") == float("inf")
+    text = registry.render()
+    assert 'latency_seconds_bucket{command="recipe",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{command="recipe",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{command="recipe"} 4' in text
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("h", "Test", ("command",))
+    histogram.observe(1, 'a"b')
+
+    assert 'command="a\\"b"' in "\n".join(histogram.render())
+
+
+@pytest.mark.asyncio
+async def test_database_queries_are_timed():
+    before = sum(
+        metrics.db_query_seconds.count(*labels)
+        for labels in metrics.db_query_seconds.series
+        if labels[1] == "SELECT"
+    )
+
+    await add_recipe(title="Cupcake", text="Bake it", image="img")
+    await get_catalog()
+
+    after = sum(
+        metrics.db_query_seconds.count(*labels)
+        for labels in metrics.db_query_seconds.series
+        if labels[1] == "SELECT"
+    )
+    assert after > before
+
+
+@pytest.mark.asyncio
+async def test_api_middleware_counts_retry_after():
+    method = SendMessage(chat_id=1, text="hi")
+
+    async def make_request(bot, method):
+        raise TelegramRetryAfter(method, "Flood control", retry_after=3)
+
+    with pytest.raises(TelegramRetryAfter):
+        await ApiMetricsMiddleware()(make_request, None, method)
+
+    assert metrics.api_retry_after.values[("sendMessage",)] >= 1
+    assert metrics.api_request_seconds.count("sendMessage") >= 1
+    assert "sendMessage" in metrics.summary()
+
+
+@pytest.mark.asyncio
+async def test_recipe_cache_totals_are_exported_as_counters():
+    await add_recipe(title="Торт", text="t", image="i")
+    await get_catalog()
+    await get_catalog()
+
+    text = metrics.registry.render()
+
+    assert "# TYPE bot_recipe_cache_hits_total counter" in text
+    assert f"bot_recipe_cache_hits_total {recipe_cache.hits}" in text
+    assert f"bot_recipe_cache_misses_total {recipe_cache.misses}" in text
+    assert "bot_recipe_cache_hits_total: " in metrics.summary()
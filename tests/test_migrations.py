@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import inspect
+
+from bot import migrations
+from bot.database import Base, engine
+
+
+def _schema(conn):
+    inspector = inspect(conn)
+    return {
+        table: {column["name"] for column in inspector.get_columns(table)}
+        for table in inspector.get_table_names()
+    }
+
+
+@pytest.mark.asyncio
+async def test_migrations_match_models():
+    async with engine.connect() as conn:
+        schema = await conn.run_sync(_schema)
+        version = await conn.run_sync(migrations.current_version)
+
+    assert version == len(migrations.MIGRATIONS)
+    for table in Base.metadata.sorted_tables:
+        assert schema[table.name] == set(table.columns.keys())
+
+
+@pytest.mark.asyncio
+async def test_upgrade_is_idempotent():
+    async with engine.begin() as conn:
+        version = await conn.run_sync(migrations.upgrade)
+
+    assert version == len(migrations.MIGRATIONS)
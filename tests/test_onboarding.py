@@ -0,0 +1,55 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+from bot.database import get_pending_onboarding, save_onboarding
+from bot.onboarding import OnboardingScheduler, Step
+
+STEPS = [
+    Step("message", "welcome"),
+    Step("video_note", "note", delay=0.01),
+    Step("message", "commands", delay=0.01),
+]
+
+
+async def _wait_until_idle(scheduler):
+    for _ in range(100):
+        if not scheduler._active:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("onboarding did not finish")
+
+
+@pytest.mark.asyncio
+async def test_onboarding_runs_steps_in_order():
+    bot = AsyncMock()
+    scheduler = OnboardingScheduler(STEPS)
+    await scheduler.start(bot)
+
+    scheduler.begin(1)
+    scheduler.begin(1)  # a repeated /start does not start a second sequence
+    await _wait_until_idle(scheduler)
+    await scheduler.stop()
+
+    assert [c.args for c in bot.send_message.await_args_list] == [
+        (1, "welcome"),
+        (1, "commands"),
+    ]
+    bot.send_video_note.assert_awaited_once_with(1, "note", protect_content=True)
+    assert await get_pending_onboarding() == []
+
+
+@pytest.mark.asyncio
+async def test_onboarding_resumes_after_restart():
+    await save_onboarding({7: (2, time.time())}, finished=set())
+    bot = AsyncMock()
+    scheduler = OnboardingScheduler(STEPS)
+
+    await scheduler.start(bot)
+    await _wait_until_idle(scheduler)
+    await scheduler.stop()
+
+    bot.send_message.assert_awaited_once_with(7, "commands")
+    bot.send_video_note.assert_not_awaited()
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.methods import EditMessageText, SendMediaGroup, SendMessage
+from aiogram.types import InputMediaPhoto
+
+from bot import metrics
+from bot.outbound import Bucket, OutboundScheduler, outbound
+
+
+def test_media_group_costs_one_token_per_item():
+    media = [InputMediaPhoto(media="a"), InputMediaPhoto(media="b")]
+
+    assert OutboundScheduler.cost(SendMessage(chat_id=1, text="hi")) == 1
+    assert OutboundScheduler.cost(SendMediaGroup(chat_id=1, media=media)) == 2
+    assert OutboundScheduler.cost(EditMessageText(text="hi")) == 0
+
+
+def test_bucket_goes_into_debt_for_large_cost():
+    bucket = Bucket(rate=1, burst=3, now=0)
+
+    assert bucket.wait(10, now=0) == 0
+    bucket.take(10)
+
+    assert bucket.wait(1, now=0) == pytest.approx(8)
+
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_starve_others():
+    scheduler = OutboundScheduler(global_rate=1000, chat_rate=20, chat_burst=1)
+    order = []
+
+    async def send(chat_id):
+        await scheduler.acquire(chat_id)
+        order.append(chat_id)
+
+    busy = [asyncio.create_task(send(1)) for _ in range(5)]
+    await asyncio.sleep(0)
+    other = asyncio.create_task(send(2))
+    await asyncio.gather(*busy, other)
+
+    assert order.index(2) <= 2
+    assert scheduler.stats()["granted"] == 6
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_global_rate_is_enforced():
+    scheduler = OutboundScheduler(global_rate=50, chat_rate=1000, chat_burst=1000)
+    started = time.monotonic()
+
+    await asyncio.gather(*(scheduler.acquire(chat_id) for chat_id in range(60)))
+
+    # 50 fit in the initial burst, the remaining 10 need ~0.2 s
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.stats()["wait_max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_outbound_totals_are_exported_as_counters():
+    await outbound.acquire(1)
+
+    text = metrics.registry.render()
+
+    assert "# TYPE bot_outbound_granted_total counter" in text
+    assert f"bot_outbound_granted_total {outbound.granted}" in text
+    assert "# TYPE bot_outbound_wait_seconds_total counter" in text
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_session import FakeSession
+from benchmarks.harness import build_dispatcher, make_bot, message_update
+from bot.database import add_recipe, add_user
+from bot.profiling import Profiler
+
+
+@pytest.mark.asyncio
+async def test_profile_captures_handlers_awaiting_the_api(tmp_path):
+    await add_user(1)
+    await add_recipe(title="Cupcake", text="Bake it", image="photo")
+    bot = make_bot(FakeSession(latency=0.05))
+    dp = build_dispatcher()
+    profiler = Profiler(interval=0.002, directory=str(tmp_path))
+
+    profiling = asyncio.create_task(profiler.profile(seconds=0.5))
+    await asyncio.gather(
+        *(
+            dp.feed_update(bot, message_update(bot, i, 1 + i, "/recipe"))
+            for i in range(5)
+        )
+    )
+    path = await profiling
+
+    lines = path.read_text().splitlines()
+    assert path.parent == tmp_path and path.suffix == ".collapsed"
+    assert any(
+        line.startswith("[await];") and "cmd_random_recipe" in line for line in lines
+    )
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert not profiler.active
+
+
+@pytest.mark.asyncio
+async def test_profile_stops_after_n_updates(tmp_path):
+    profiler = Profiler(interval=0.01, directory=str(tmp_path))
+
+    profiling = asyncio.create_task(profiler.profile(seconds=30, updates=2))
+    await asyncio.sleep(0.05)
+    profiler.count_update()
+    profiler.count_update()
+
+    await asyncio.wait_for(profiling, 1)
+    assert profiler.updates == 2
+    assert profiler.samples["[idle]"] > 0
@@ -0,0 +1,78 @@
+import io
+import json
+
+import pytest
+
+from bot import recipe_io
+from bot.database import get_catalog, get_counters, import_recipes, iter_recipe_rows
+
+
+def test_jsonl_errors_are_reported_per_line(tmp_path):
+    path = tmp_path / "recipes.jsonl"
+    path.write_text(
+        '{"title": "Cupcake", "text": "Bake it", "image": "img"}\n'
+        "\n"
+        '{"title": "Muffin", "text": "Bake it"}\n'
+        "not json\n"
+        '{"title": 1, "text": "x", "image": "y"}\n',
+        encoding="utf-8",
+    )
+
+    assert [line for line, _ in recipe_io.find_errors(path)] == [3, 4, 5]
+    assert recipe_io.find_errors(path)[0] == (3, "нет поля image")
+
+
+def test_csv_rows_are_validated(tmp_path):
+    path = tmp_path / "recipes.csv"
+    path.write_text(
+        "title,text,image,video\nCupcake,Bake it,img,\nMuffin,,img,vid\n",
+        encoding="utf-8",
+    )
+
+    records = list(recipe_io.iter_records(path))
+
+    assert records[0] == (
+        2,
+        {"title": "Cupcake", "text": "Bake it", "image": "img", "video": None},
+        None,
+    )
+    assert records[1] == (3, None, "нет поля text")
+
+
+def test_unreadable_files_are_reported_not_raised(tmp_path):
+    cp1251 = tmp_path / "excel.csv"
+    cp1251.write_bytes("title,text,image\nКекс,Спекти,img\n".encode("cp1251"))
+    binary = tmp_path / "recipes.jsonl"
+    binary.write_bytes(b'{"title": "A", "text": "B", "image": "C"}\n\xff\n')
+    broken = tmp_path / "broken.csv"
+    # Past csv.field_size_limit(), e.g. an unclosed quote swallowing the file
+    broken.write_text('title,text,image\nA,"' + "x" * 200_000, encoding="utf-8")
+
+    assert recipe_io.find_errors(cp1251) == [(2, recipe_io.NOT_UTF8)]
+    assert recipe_io.find_errors(binary) == [(2, recipe_io.NOT_UTF8)]
+    assert [line for line, _ in recipe_io.find_errors(broken)] == [2]
+
+
+@pytest.mark.asyncio
+async def test_import_and_export_round_trip():
+    recipes = (
+        {"title": f"R{i}", "text": "t", "image": "i", "video": None} for i in range(25)
+    )
+
+    assert await import_recipes(recipes, batch_size=10) == 25
+    assert len(await get_catalog()) == 25
+    assert (await get_counters())["recipes"] == 25
+
+    buffer = io.StringIO()
+    writer = recipe_io.RecordWriter(buffer, "jsonl")
+    async for rows in iter_recipe_rows(batch_size=10):
+        writer.write(rows)
+
+    lines = buffer.getvalue().splitlines()
+    assert writer.count == 25
+    assert json.loads(lines[0]) == {
+        "title": "R0",
+        "text": "t",
+        "image": "i",
+        "video": None,
+    }
@@ -1,68 +1,205 @@
+import asyncio
+
 import pytest
-from unittest.mock import AsyncMock, patch
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, User as TelegramUser, Chat
-from bot.routes.user import user_router
-from bot.routes.admin import admin_router
-from bot.routes.recipes import recipe_router
-from bot.config import ADMIN_ID
+from aiogram.methods import AnswerInlineQuery, SendMessage, SendPhoto
+from aiogram.types import Update, User
+from aiogram.utils.payload import encode_payload
+
+from benchmarks.fake_session import FakeSession
+from benchmarks.harness import build_dispatcher, make_bot, message_update
+from bot.config import settings
+from bot.database import add_recipe, add_user, get_recipe, is_member
+from bot.routes import admin
+from bot.routes.admin import RecipePickCallback
+
+USER_ID = 12345
 
-@pytest.fixture
-def bot():
-    return AsyncMock(spec=Bot)
 
 @pytest.fixture
-def dp(bot):
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-    dp.include_router(user_router)
-    dp.include_router(admin_router)
-    dp.include_router(recipe_router)
-    return dp
+def session():
+    return FakeSession()
+
 
 @pytest.fixture
-def message(bot):
-    message = AsyncMock(spec=Message)
-    message.bot = bot
-    message.from_user = AsyncMock(spec=TelegramUser)
-    message.chat = AsyncMock(spec=Chat)
-    return message
+def send(session):
+    bot = make_bot(session)
+    dp = build_dispatcher()
+
+    async def send(text, user_id=USER_ID):
+        await dp.feed_update(bot, message_update(bot, 1, user_id, text))
+
+    return send
+
+
+@pytest.mark.asyncio
+async def test_start_ignores_non_members(send, session):
+    await send("/start")
+
+    assert session.requests == []
+
+
+@pytest.mark.asyncio
+async def test_deep_link_registers_user(send):
+    await send(f"/start {encode_payload(settings.VALID_CODE)}")
+
+    assert await is_member(USER_ID)
+
+
+@pytest.mark.asyncio
+async def test_admin_command_not_admin(send, session):
+    await send("/admin")
+
+    assert [m.text for m in session.sent(SendMessage)] == ["Ви не адміністратор."]
+
+
+@pytest.mark.asyncio
+async def test_admin_command_is_admin(send, session, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_IDS", [USER_ID])
+
+    await send("/admin")
+
+    (answer,) = session.sent(SendMessage)
+    assert "Команды администратора" in answer.text
+
+
+@pytest.mark.asyncio
+async def test_broadcast_takes_text_from_command_args(session, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_IDS", [USER_ID])
+    started = []
+
+    async def start_broadcast(bot, text, chat_id):
+        started.append(text)
+
+    monkeypatch.setattr(admin, "start_broadcast", start_broadcast)
+    bot = make_bot(session)
+    bot._me = User(id=bot.id, is_bot=True, first_name="bench", username="recipes_bot")
+    dp = build_dispatcher()
+    for update_id, text in enumerate(
+        (
+            "/broadcast",
+            "/broadcast@recipes_bot   ",
+            "/broadcast@recipes_bot Привіт\nусім",
+        )
+    ):
+        await dp.feed_update(bot, message_update(bot, update_id, USER_ID, text))
+
+    assert started == ["Привіт\nусім"]
+    assert [m.text for m in session.sent(SendMessage)] == [
+        "Использование: /broadcast текст рассылки"
+    ] * 2
+
+
+@pytest.mark.asyncio
+async def test_admin_deletes_recipe_in_unit_of_work(send, session, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_IDS", [USER_ID])
+    recipe = await add_recipe(title="Cupcake", text="Bake it", image="photo")
+    bot = make_bot(session)
+
+    await send("/delete_recipe")
+    await build_dispatcher().feed_update(
+        bot,
+        Update.model_validate(
+            {
+                "update_id": 2,
+                "callback_query": {
+                    "id": "1",
+                    "chat_instance": "1",
+                    "from": {"id": USER_ID, "is_bot": False, "first_name": "A"},
+                    "message": {
+                        "message_id": 1,
+                        "date": 0,
+                        "chat": {"id": USER_ID, "type": "private"},
+                    },
+                    "data": RecipePickCallback(
+                        action="delete", recipe_id=recipe.id
+                    ).pack(),
+                },
+            },
+            context={"bot": bot},
+        ),
+    )
+
+    assert await get_recipe(recipe.id) is None
+    assert session.sent(SendMessage)[-1].text == "✅ Рецепт успешно удален!"
+
+
+@pytest.mark.asyncio
+async def test_all_recipes_empty(send, session):
+    await add_user(USER_ID)
+
+    await send("/all_recipes")
+
+    assert [m.text for m in session.sent(SendMessage)] == [
+        "Пока нет доступных рецептов."
+    ]
+
 
 @pytest.mark.asyncio
-async def test_start_command(message, dp):
-    message.text = "/start"
-    message.from_user.id = 12345
-    
-    await dp.feed_update(message)
-    
-    message.answer.assert_called_once()
-    assert "Добро пожаловать" in message.answer.call_args[0][0]
+async def test_recipe_replays_delivery_plan(send, session):
+    await add_user(USER_ID)
+    await add_recipe(title="Cupcake", text="Bake it", image="photo")
+
+    await send("/recipe")
+
+    (photo,) = session.sent(SendPhoto)
+    assert (photo.chat_id, photo.photo, photo.caption) == (
+        USER_ID,
+        "photo",
+        "Cupcake\n\nBake it",
+    )
+
 
 @pytest.mark.asyncio
-async def test_admin_command_not_admin(message, dp):
-    message.text = "/admin"
-    message.from_user.id = 12345  # Not admin
-    
-    await dp.feed_update(message)
-    
-    message.answer.assert_not_called()
+async def test_repeated_recipe_is_coalesced_while_in_flight(session):
+    await add_user(USER_ID)
+    await add_recipe(title="Cupcake", text="Bake it", image="photo")
+    session.latency = 0.05
+    bot = make_bot(session)
+    dp = build_dispatcher()
+
+    await asyncio.gather(
+        *(
+            dp.feed_update(bot, message_update(bot, i, USER_ID, "/recipe"))
+            for i in range(5)
+        )
+    )
+    await dp.feed_update(bot, message_update(bot, 5, USER_ID, "/recipe"))
+
+    assert len(session.sent(SendPhoto)) == 2
+
 
 @pytest.mark.asyncio
-async def test_admin_command_is_admin(message, dp):
-    message.text = "/admin"
-    message.from_user.id = ADMIN_ID
-    
-    await dp.feed_update(message)
-    
-    message.answer.assert_called_once()
-    assert "Команды администратора" in message.answer.call_args[0][0]
+async def test_flooding_user_is_throttled_with_one_notice(send, session):
+    await add_user(USER_ID)
+
+    for _ in range(10):
+        await send("/all_recipes")
+
+    texts = [m.text for m in session.sent(SendMessage)]
+    assert texts.count("Пока нет доступных рецептов.") == 5
+    assert len([t for t in texts if t.startswith("Забагато запитів")]) == 1
+
 
 @pytest.mark.asyncio
-async def test_all_recipes_empty(message, dp):
-    message.text = "/all_recipes"
-    
-    with patch('bot.routes.user.get_all_recipes', return_value=[]):
-        await dp.feed_update(message)
-        
-        message.answer.assert_called_once_with("Пока нет доступных рецептов.")
\ No newline at end of file
+async def test_inline_typing_is_never_throttled(session):
+    await add_user(USER_ID)
+    bot = make_bot(session)
+    dp = build_dispatcher()
+    query = "шоколадний кекс"
+
+    for i in range(1, len(query) + 1):
+        update = Update.model_validate(
+            {
+                "update_id": i,
+                "inline_query": {
+                    "id": str(i),
+                    "from": {"id": USER_ID, "is_bot": False, "first_name": "A"},
+                    "query": query[:i],
+                    "offset": "",
+                },
+            },
+            context={"bot": bot},
+        )
+        await dp.feed_update(bot, update)
+
+    assert len(session.sent(AnswerInlineQuery)) == len(query)
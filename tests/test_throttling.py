@@ -0,0 +1,23 @@
+from bot.throttling import UserThrottle
+
+
+def test_throttle_refills_and_reports_first_refusal():
+    throttle = UserThrottle(rate=1, burst=3)
+
+    assert throttle.take(1, 3, now=0) == (0.0, False)
+    assert throttle.take(1, 2, now=0.5) == (1.5, True)
+    assert throttle.take(1, 2, now=1.0) == (1.0, False)  # same streak
+    assert throttle.take(2, 1, now=1.0) == (0.0, False)  # other users unaffected
+    assert throttle.take(1, 2, now=2.0) == (0.0, False)
+
+
+def test_throttle_forgets_idle_users():
+    throttle = UserThrottle(rate=1, burst=3, ttl=10)
+
+    throttle.take(1, 3, now=0)
+    throttle.take(2, 1, now=5)
+    throttle.take(3, 1, now=12)
+
+    assert len(throttle) == 2
+    # The forgotten user starts again with a full bucket
+    assert throttle.take(1, 3, now=12) == (0.0, False)
@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import SetWebhook
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.fake_session import FakeSession
+from bot.config import settings
+from bot.webhook import SECRET_HEADER, WebhookServer, run_webhook
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+        "text": "/recipe",
+    },
+}
+
+
+@pytest.fixture
+async def webhook():
+    dispatcher = AsyncMock()
+    dispatcher.feed_update.return_value = None
+    server = WebhookServer(
+        dispatcher, Bot("42:TEST"), secret="s3cret", workers=2, queue_size=1
+    )
+    client = TestClient(TestServer(server.app("/webhook")))
+    await client.start_server()
+    yield server, client
+    await client.close()
+    await server.stop_workers(drain_timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(webhook):
+    server, client = webhook
+
+    response = await client.post("/webhook", json=UPDATE)
+
+    assert response.status == 401
+    assert server.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_webhook_queues_and_processes_updates(webhook):
+    server, client = webhook
+    server.start_workers()
+
+    response = await client.post(
+        "/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"}
+    )
+    await asyncio.wait_for(server.queue.join(), timeout=1)
+
+    assert response.status == 200
+    server.dispatcher.feed_update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_webhook_sheds_load_when_queue_is_full(webhook):
+    server, client = webhook
+    headers = {SECRET_HEADER: "s3cret"}
+
+    first = await client.post("/webhook", json=UPDATE, headers=headers)
+    second = await client.post("/webhook", json=UPDATE, headers=headers)
+
+    assert first.status == 200
+    assert second.status == 503
+
+
+def test_webhook_server_requires_a_secret():
+    with pytest.raises(ValueError):
+        WebhookServer(AsyncMock(), Bot("42:TEST"), secret="")
+
+
+@pytest.mark.asyncio
+async def test_run_webhook_generates_missing_secret(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", "")
+    monkeypatch.setattr(settings, "WEBHOOK_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "WEBHOOK_PORT", 0)
+    session = FakeSession()
+    dispatcher = AsyncMock()
+    dispatcher.resolve_used_update_types = lambda: ["message"]
+
+    task = asyncio.create_task(run_webhook(dispatcher, Bot("42:TEST", session=session)))
+    while not session.sent(SetWebhook):
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    (request,) = session.sent(SetWebhook)
+    assert len(request.secret_token) >= 32